@@ -1,15 +1,17 @@
 ## todo: http://blog.vwelch.com/2011/04/combining-configparser-and-argparse.html
 
+import os
 import sys
+import errno
+import hashlib
 import warnings
-import argparse
-from collections import OrderedDict
-from xml.etree.ElementTree import Element, SubElement, tostring, parse
-from xml.dom.minidom import parseString
-import datetime
-import pytz
-from StringIO import StringIO
-import atexit
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+# Tools built on CTDopts are mostly short-lived processes, so import time matters. Only the modules needed
+# for defining parameters are imported here, everything else (argparse, XML handling, timezones for
+# logging, JSON for sweep specs...) is imported in the methods that use it, the first time
+# they are called. See `python benchmark.py startup` for checking import and parse times against a budget.
 
 # # lxml's interface is almost the same as xml's but you can order element attribues with it
 # # (not that you should do it but it's still nice to see parameter name as first attribute
@@ -18,25 +20,79 @@ import atexit
 # from lxml.etree import Element, SubElement, tostring, parse
 
 
+# NumPy is only used for casting and range checking large lists faster, the builtin fallback is good enough
+# otherwise. Importing it takes longer than handling a short list without it, so it's only imported once a
+# list of at least this many values comes along.
+_NUMPY_LIST_SIZE = 10000
+_numpy = None  # the numpy module once imported, False if it's not installed
+
+
+def _get_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy as _numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+# list parameter problems are reported once per parameter, with this many example values
+_REPORTED_VALUES = 5
+
+
 class _NumericRange(object):
+    __slots__ = ('param_name', 'n_type', 'n_min', 'n_max')
+
     def __init__(self, param_name, n_type, n_min=None, n_max=None):
         self.param_name = param_name
         self.n_type = n_type
         self.n_min = n_min
         self.n_max = n_max
 
-    def argparse_type(self):
+    def check(self, value):
+        # returns the problem with an already cast value as a string, or None if it's in range
+        if self.n_min is not None and value < self.n_min:
+            return "Parameter %s value %s is below minimum %s" % (self.param_name, value, self.n_min)
+        if self.n_max is not None and value > self.n_max:
+            return "Parameter %s value %s is above maximum %s" % (self.param_name, value, self.n_max)
+
+    def argparse_type(self, problems=None):
+        # (with a problems list, out of range values are appended to it instead of being warned about)
         def is_in_range(value):
             value = self.n_type(value)  # TODO: do we need a warning if 5.6 gets cast to 5?
-            if self.n_min is not None and value < self.n_min:
-                warnings.warn("Parameter %s value %s is below minimum %s" % (self.param_name, value, self.n_min))
-            if self.n_max is not None and value > self.n_max:
-                warnings.warn("Parameter %s value %s is above maximum %s" % (self.param_name, value, self.n_max))
+            problem = self.check(value)
+            if problem is not None:
+                if problems is None:
+                    warnings.warn(problem)
+                else:
+                    problems.append(problem)
             return value
         # we'll pass this function handle to argparse's `type` option that not only casts input as it
         # would normally but also performs a range check and stalls parsing if value is illegal
         return is_in_range
 
+    def check_all(self, values):
+        # bulk version of check() for list parameters: one message for all offending values, or None
+        if not len(values):
+            return None
+        numpy = len(values) >= _NUMPY_LIST_SIZE and _get_numpy()
+        if numpy:
+            array = numpy.asarray(values)
+            below = array < self.n_min if self.n_min is not None else numpy.zeros(len(array), bool)
+            above = array > self.n_max if self.n_max is not None else numpy.zeros(len(array), bool)
+            offending = array[below | above]
+            n_offending, offending = len(offending), offending[:_REPORTED_VALUES].tolist()
+        else:
+            # min()/max() run in C, we only loop in Python if there's something to report
+            if (self.n_min is None or min(values) >= self.n_min) and (self.n_max is None or max(values) <= self.n_max):
+                return None
+            offending = [value for value in values if (self.n_min is not None and value < self.n_min) or
+                (self.n_max is not None and value > self.n_max)]
+            n_offending = len(offending)
+        if n_offending:
+            return "Parameter %s: %d of %d values out of range %s. First ones: %s" % (self.param_name, n_offending,
+                len(values), self.ctd_range_string(), ', '.join(map(str, offending[:_REPORTED_VALUES])))
+
     def ctd_range_string(self):
         n_min = str(self.n_min) if self.n_min is not None else ''
         n_max = str(self.n_max) if self.n_max is not None else ''
@@ -44,20 +100,39 @@ class _NumericRange(object):
 
 
 class _FileFormat(object):
+    __slots__ = ('param_name', 'formats')
+
     def __init__(self, param_name, formats):
         self.param_name = param_name
         self.formats = formats
 
-    def argparse_type(self):
+    def check(self, filename):
+        # returns the problem with a filename as a string, or None if its extension is allowed
+        # os.path.splitext(filename)[1][1:] wouldn't handle *.fastq.gz or any double-extension
+        for format in self.formats:
+            if filename.endswith('.' + format):  # TODO: should we be lenient with letter case?
+                return None
+        return "Parameter %s's file extension not in allowed list. Allowed: %s. Actual: %s" % (
+            self.param_name, '/'.join(self.formats), filename)
+
+    def check_all(self, filenames):
+        # bulk version of check() for list parameters: one message for all offending values, or None
+        suffixes = tuple('.' + format for format in self.formats)
+        offending = [filename for filename in filenames if not filename.endswith(suffixes)]
+        if offending:
+            return "Parameter %s: %d of %d file extensions not in allowed list. Allowed: %s. First ones: %s" % (
+                self.param_name, len(offending), len(filenames), '/'.join(self.formats),
+                ', '.join(offending[:_REPORTED_VALUES]))
+
+    def argparse_type(self, problems=None):
         def legal_formats(filename):
-            # os.path.splitext(filename)[1][1:] wouldn't handle *.fastq.gz or any double-extension
-            for format in self.formats:
-                if filename.endswith('.' + format):  # TODO: should we be lenient with letter case?
-                    return filename
-            else:
-                warnings.warn("Parameter %s's file extension not in allowed list. Allowed: %s. Actual: %s" %
-                    (self.param_name, '/'.join(self.formats), filename))
-                return filename
+            problem = self.check(filename)
+            if problem is not None:
+                if problems is None:
+                    warnings.warn(problem)
+                else:
+                    problems.append(problem)
+            return filename
         # similarly to NumericRange, this function object will perform argparse's type enforcing
         # w/ a filename extension checking step. One could even implement MIME-type checking here
         return legal_formats
@@ -66,38 +141,1411 @@ class _FileFormat(object):
         return ','.join(('*.' + format for format in self.formats))
 
 
-# This class can hijack sys.stdout with a transparent interface but forwarding all write and flush
-# calls to any other stream object. Modeled after http://stackoverflow.com/a/16551730
-# Usage: sys.stdout = _MultiStream(sys.stdout, own_StringIO_object)
-class _MultiStream(object):
-    def __init__(self, stream1, stream2):
-        self._stream1 = stream1
-        self._stream2 = stream2
-
-    def __getattr__(self, attr, *args, **kwargs):
-        return self._wrap(attr, *args, **kwargs)
+def _utc_timestamp():
+    import datetime
+    import pytz
+    return datetime.datetime.now(pytz.utc).isoformat()
+
+
+def _utf8_complete_length(data):
+    # length of data without a multibyte UTF-8 character that's cut off at its end
+    for back in range(1, min(4, len(data)) + 1):
+        byte = ord(data[-back])
+        if byte < 0x80:
+            break
+        if byte >= 0xC0:  # the lead byte says how long the character is
+            needed = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            return len(data) - back if back < needed else len(data)
+    return len(data)
+
+
+def _utf8_lstrip(data):
+    # data without the continuation bytes of a UTF-8 character that's cut off at its start
+    start = 0
+    while start < min(3, len(data)) and 0x80 <= ord(data[start]) < 0xC0:
+        start += 1
+    return data[start:]
+
+
+# File-like sink for captured stdout/stderr output with bounded memory use. Up to memory_limit bytes are
+# kept in memory, beyond that everything is spilled to an anonymous temporary file. If max_bytes is set,
+# only that much is kept at all: the first max_bytes ('head'), the last max_bytes ('tail') or half of
+# each ('head_tail'), with a note of how much was left out in between. A tail window larger than
+# memory_limit is kept in a ring buffer in a temporary file instead. finalize_log() streams the content
+# into the log CTD with iter_chunks() instead of building one big string.
+class _CaptureBuffer(object):
+    def __init__(self, max_bytes=None, truncate='head_tail', memory_limit=8 * 1024 * 1024):
+        if truncate not in ('head', 'tail', 'head_tail'):
+            raise ValueError("truncate must be 'head', 'tail' or 'head_tail', not %r" % truncate)
+        self.max_bytes = max_bytes
+        self.truncate = truncate
+        self.memory_limit = memory_limit
+        self.total_size = 0  # everything ever written, including what was truncated
+
+        if max_bytes is None:
+            self._head_limit, self._tail_limit = None, 0
+        elif truncate == 'head':
+            self._head_limit, self._tail_limit = max_bytes, 0
+        elif truncate == 'tail':
+            self._head_limit, self._tail_limit = 0, max_bytes
+        else:
+            self._head_limit = max_bytes / 2
+            self._tail_limit = max_bytes - self._head_limit
+
+        self._head_chunks = []
+        self._head_size = 0
+        self._spill_file = None
+        self._tail_chunks = deque()
+        self._tail_ring = _TailRingFile(self._tail_limit) if self._tail_limit > memory_limit else None
+        self._tail_size = 0
+        # writers (tee streams, fd capture threads) and log checkpoints may run in different threads
+        import threading
+        self._lock = threading.Lock()
+
+    def write(self, data):
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+        with self._lock:
+            self._write(data)
+
+    def _write(self, data):
+        self.total_size += len(data)
+
+        if self._head_limit is None or self._head_size < self._head_limit:
+            room = len(data) if self._head_limit is None else self._head_limit - self._head_size
+            self._write_head(data[:room])
+            data = data[room:]
+
+        if data and self._tail_ring is not None:
+            self._tail_ring.write(data)
+            self._tail_size += len(data)
+        elif data and self._tail_limit:
+            self._tail_chunks.append(data)
+            self._tail_size += len(data)
+            # drop whole chunks that are out of the window, the first one is trimmed when reading
+            while self._tail_size - len(self._tail_chunks[0]) >= self._tail_limit:
+                self._tail_size -= len(self._tail_chunks.popleft())
+
+    def _write_head(self, data):
+        if self._spill_file is None and self._head_size + len(data) > self.memory_limit:
+            import tempfile
+            self._spill_file = tempfile.TemporaryFile()
+            self._spill_file.writelines(self._head_chunks)
+            self._head_chunks = []
+        if self._spill_file is not None:
+            self._spill_file.write(data)
+        else:
+            self._head_chunks.append(data)
+        self._head_size += len(data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        if self._spill_file is not None:
+            self._spill_file.flush()
+
+    def tail(self, n_bytes):
+        # the last n_bytes of what is kept (see iter_chunks()), read without going through all of it. Cuts
+        # are moved to UTF-8 character boundaries, so the result may be a few bytes shorter.
+        with self._lock:
+            chunks = []
+            size = 0
+            if self._tail_ring is not None:
+                chunks.append(''.join(self._tail_ring.iter_chunks(n_bytes, n_bytes)))
+                size = len(chunks[0])
+            else:
+                for chunk in reversed(self._tail_chunks):
+                    if size >= n_bytes:
+                        break
+                    chunks.append(chunk)
+                    size += len(chunk)
+                kept = min(self._tail_size, self._tail_limit)
+                if size > kept:  # the oldest chunk reaches back beyond the window
+                    chunks[-1] = chunks[-1][size - kept:]
+                    size = kept
+            tail_part = ''.join(reversed(chunks))[-n_bytes:]
+            head_part = ''
+            if len(tail_part) < n_bytes:
+                if self._spill_file is not None:
+                    self._spill_file.flush()
+                    self._spill_file.seek(max(0, self._head_size - (n_bytes - len(tail_part))))
+                    head_part = self._spill_file.read(n_bytes - len(tail_part))
+                    self._spill_file.seek(0, os.SEEK_END)
+                else:
+                    chunks = []
+                    size = 0
+                    for chunk in reversed(self._head_chunks):
+                        if size >= n_bytes - len(tail_part):
+                            break
+                        chunks.append(chunk)
+                        size += len(chunk)
+                    head_part = ''.join(reversed(chunks))[-(n_bytes - len(tail_part)):]
+                if head_part and self.omitted_size():
+                    # head and tail don't join up, neither may end or start in the middle of a character
+                    head_part = head_part[:_utf8_complete_length(head_part)]
+                    tail_part = _utf8_lstrip(tail_part)
+            return _utf8_lstrip(head_part + tail_part)
+
+    def omitted_size(self):
+        return self.total_size - self._head_size - min(self._tail_size, self._tail_limit)
+
+    def _iter_head(self, chunk_size):
+        if self._spill_file is not None:
+            self._spill_file.flush()
+            self._spill_file.seek(0)
+            remaining = self._head_size
+            while remaining > 0:
+                chunk = self._spill_file.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+            self._spill_file.seek(0, os.SEEK_END)  # further writes must append
+        else:
+            for chunk in self._head_chunks:
+                yield chunk
+
+    def _iter_tail(self, chunk_size):
+        if self._tail_ring is not None:
+            for chunk in self._tail_ring.iter_chunks(chunk_size):
+                yield chunk
+
+        skip = max(0, self._tail_size - self._tail_limit)
+        for chunk in self._tail_chunks:
+            if skip:
+                chunk, skip = chunk[skip:], max(0, skip - len(chunk))
+            if chunk:
+                yield chunk
+
+    def iter_chunks(self, chunk_size=1024 * 1024):
+        omitted = self.omitted_size()
+        if not omitted:
+            for chunk in self._iter_head(chunk_size):
+                yield chunk
+            for chunk in self._iter_tail(chunk_size):
+                yield chunk
+            return
 
-    def _wrap(self, attr, *args, **kwargs):
-        def g(*a, **kw):
-            if hasattr(self._stream2, attr):  # if stream2 has the required method, run it
-                getattr(self._stream2, attr, *args, **kwargs)(*a, **kw)
-            return getattr(self._stream1, attr, *args, **kwargs)(*a, **kw)
-        return g
+        # Truncation cuts bytes, not characters. A UTF-8 character split by the head or the tail cut
+        # would make the log CTD malformed, so its remaining bytes are dropped as well.
+        held = ''  # the last few bytes of the head, which may have to go
+        for chunk in self._iter_head(chunk_size):
+            chunk = held + chunk
+            if len(chunk) > 3:
+                yield chunk[:-3]
+            held = chunk[-3:]
+        cut = _utf8_complete_length(held)
+        if cut:
+            yield held[:cut]
+        omitted += len(held) - cut
+
+        tail = self._iter_tail(chunk_size)
+        first = ''
+        for chunk in tail:
+            first += chunk
+            if len(first) > 3:
+                break
+        stripped = _utf8_lstrip(first)
+        omitted += len(first) - len(stripped)
+
+        yield '\n[... %d bytes omitted ...]\n' % omitted
+        if stripped:
+            yield stripped
+        for chunk in tail:
+            yield chunk
+
+    def getvalue(self):
+        return ''.join(self.iter_chunks())
+
+    def __nonzero__(self):
+        return self.total_size > 0
+
+    def close(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+        if self._tail_ring is not None:
+            self._tail_ring.close()
+
+
+# Ring buffer in an anonymous temporary file keeping the last `size` bytes written to it, for tail windows
+# of _CaptureBuffer too large to keep in memory. The file is only created on the first write and never
+# grows beyond `size`.
+class _TailRingFile(object):
+    def __init__(self, size):
+        self.size = size
+        self.written = 0  # everything ever written, the last min(written, size) bytes are kept
+        self._file = None
+
+    def write(self, data):
+        if self._file is None:
+            import tempfile
+            self._file = tempfile.TemporaryFile()
+        if len(data) > self.size:
+            self.written += len(data) - self.size
+            data = data[-self.size:]
+        position = self.written % self.size
+        first = data[:self.size - position]
+        self._file.seek(position)
+        self._file.write(first)
+        if len(first) < len(data):
+            self._file.seek(0)
+            self._file.write(data[len(first):])
+        self.written += len(data)
+
+    def iter_chunks(self, chunk_size, n_bytes=None):
+        # the last n_bytes of what is kept (all of it by default), oldest first
+        kept = min(self.written, self.size)
+        n_bytes = kept if n_bytes is None else min(n_bytes, kept)
+        position = (self.written - n_bytes) % self.size
+        while n_bytes > 0:
+            self._file.seek(position)
+            chunk = self._file.read(min(chunk_size, n_bytes, self.size - position))
+            if not chunk:
+                break
+            n_bytes -= len(chunk)
+            position = (position + len(chunk)) % self.size
+            yield chunk
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# Tees everything written to a stream (sys.stdout or sys.stderr) into a capture object as well.
+# Usage: sys.stdout = _TeeStream(sys.stdout, capture_buffer)
+# write(), writelines() and flush() are plain methods: writes go to the stream right away but are handed
+# to the capture side in batches of batch_size bytes, under a lock so worker threads can print at the
+# same time. flush() hands over what's pending, call it before reading the capture. Every other
+# attribute (encoding, fileno(), isatty(), the softspace flag Python 2's print sets...) is forwarded
+# to the original stream.
+class _TeeStream(object):
+    def __init__(self, stream, capture, batch_size=64 * 1024):
+        import threading
+        set_own = super(_TeeStream, self).__setattr__
+        set_own('_stream', stream)
+        set_own('_capture', capture)
+        set_own('_batch_size', batch_size)
+        set_own('_pending', [])
+        set_own('_pending_size', [0])  # in a list so write() can update it, __setattr__ is forwarded
+        set_own('_lock', threading.Lock())
+
+    def write(self, data):
+        self._stream.write(data)
+        with self._lock:
+            self._pending.append(data)
+            self._pending_size[0] += len(data)
+            if self._pending_size[0] >= self._batch_size:
+                self._flush_pending()
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        self._stream.flush()
+        with self._lock:
+            self._flush_pending()
+            self._capture.flush()
+
+    def hand_over(self):
+        # hands over what's pending to the capture without flushing the stream (for log checkpoints)
+        with self._lock:
+            self._flush_pending()
+
+    def _flush_pending(self):
+        if self._pending:
+            self._capture.write(''.join(data.encode('utf-8') if isinstance(data, unicode) else data
+                for data in self._pending))
+        del self._pending[:]
+        self._pending_size[0] = 0
+
+    def __getattr__(self, attr):
+        return getattr(self._stream, attr)
 
     def __setattr__(self, name, value):
-        if name in ('_stream1', '_stream2'):
-            self.__dict__[name] = value
-        else:
-            return setattr(self._stream1, name, value)
+        setattr(self._stream, name, value)
 
     def __delattr__(self, name):
-        return delattr(self._stream1, name)
+        delattr(self._stream, name)
+
+
+# Captures a file descriptor (1 or 2) at OS level: the fd is pointed to a pipe with os.dup2, so output of
+# child processes and C extensions gets captured too, not just what Python code writes to sys.stdout.
+# A daemon thread drains the pipe in big reads, copies the data to the original fd (unless echo is off)
+# and to the capture buffer, so writers never wait on us for long. stop() restores the fd and waits
+# (up to `timeout` seconds, children may still hold the pipe) for the remaining output. The thread owns
+# the pipe's read end and the saved copy of the original fd and closes both once the pipe is drained, so
+# a thread outliving stop() never reads or echoes to a closed (or meanwhile reused) fd number.
+class _FdCapture(object):
+    def __init__(self, fd, capture, echo=True, read_size=64 * 1024):
+        self.fd = fd
+        self.capture = capture
+        self.echo = echo
+        self.read_size = read_size
+        self._saved_fd = None
+        self._reader = None
+
+    def start(self):
+        import threading
+        self._saved_fd = os.dup(self.fd)
+        read_fd, write_fd = os.pipe()
+        os.dup2(write_fd, self.fd)
+        os.close(write_fd)
+        self._reader = threading.Thread(target=self._drain, args=(read_fd, self._saved_fd),
+            name='CTDopts fd %d capture' % self.fd)
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _drain(self, read_fd, saved_fd):
+        try:
+            while True:
+                try:
+                    data = os.read(read_fd, self.read_size)
+                except OSError as e:
+                    if e.errno == errno.EINTR:
+                        continue
+                    break
+                if not data:  # every write end is closed
+                    break
+                if self.echo:
+                    view = data
+                    while view:
+                        view = view[os.write(saved_fd, view):]
+                self.capture.write(data)
+        finally:
+            os.close(read_fd)
+            os.close(saved_fd)
+
+    def stop(self, timeout=5.0):
+        if self._reader is None:
+            return
+        # closes our last copy of the pipe's write end. The reader is done (and closes its fds) once
+        # children holding a copy have exited too, if they outlive the timeout it carries on without us.
+        os.dup2(self._saved_fd, self.fd)
+        self._reader.join(timeout)
+        self._reader = None
+        self._saved_fd = None
+
+
+# What a log CTD records about a run beyond the <log> node (phase timings, resource usage, input file
+# checksums) goes into an 'execution' NODE after the tool's parameters, as ITEMs like the parameter
+# fingerprint: CTD_0_3.xsd allows nothing but text in <log>, and reading a CTD stops at the end of the
+# parameters, so it's never taken for one. See CTDopts._execution_node().
+def _record_node(parent, name, description=''):
+    from xml.etree.ElementTree import Element, SubElement
+    if parent is None:
+        return Element('NODE', name=name, description=description)
+    return SubElement(parent, 'NODE', name=name, description=description)
+
+
+def _record_item(parent, name, item_type, value):
+    from xml.etree.ElementTree import SubElement
+    return SubElement(parent, 'ITEM', name=name, type=item_type, value=value)
+
+
+# Accumulates wall clock and CPU time per named phase, both of CTDopts itself (read_ini, parse_args,
+# store_call_value, write_ctd) and of tool code using CTDopts.phase(name). Phases may nest and repeat,
+# each one adds up its own calls. Written to the log CTD as a 'phases' NODE with a NODE per phase; the
+# final write of the log CTD itself can't be in there, so write_ctd only counts earlier writes.
+class _PhaseTimer(object):
+    def __init__(self):
+        import threading
+        self.phases = OrderedDict()  # name: [calls, wall time, cpu time]
+        self._lock = threading.Lock()
+
+    def add(self, name, wall_time, cpu_time):
+        with self._lock:
+            phase = self.phases.setdefault(name, [0, 0.0, 0.0])
+            phase[0] += 1
+            phase[1] += wall_time
+            phase[2] += cpu_time
+
+    def xml_node(self):
+        phases = _record_node(None, 'phases', 'Calls, wall clock and CPU time in seconds of named phases')
+        with self._lock:
+            for name, (calls, wall_time, cpu_time) in self.phases.iteritems():
+                phase = _record_node(phases, name)
+                _record_item(phase, 'calls', 'int', str(calls))
+                _record_item(phase, 'wallTime', 'double', '%.6f' % wall_time)
+                _record_item(phase, 'cpuTime', 'double', '%.6f' % cpu_time)
+        return phases
+
+
+def _cpu_time():
+    # user + system time of the process. getrusage() has microsecond resolution, os.times() often 10ms.
+    try:
+        import resource
+    except ImportError:
+        times = os.times()
+        return times[0] + times[1]
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+# What CTDopts.phase(name) returns: a context manager, or a decorator timing every call of a function.
+class _Phase(object):
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self._starts = []  # a stack, so the same phase object can be re-entered
+
+    def __enter__(self):
+        import time
+        self._starts.append((time.time(), _cpu_time()))
+        return self
+
+    def __exit__(self, *exc_info):
+        import time
+        wall_start, cpu_start = self._starts.pop()
+        self.timer.add(self.name, time.time() - wall_start, _cpu_time() - cpu_start)
+        return False
+
+    def __call__(self, function):
+        import functools
+
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            with _Phase(self.timer, self.name):
+                return function(*args, **kwargs)
+        return timed_function
+
+
+# The 'resources' NODE of the log CTD: getrusage() of the tool ('self') and of its (waited for) child
+# processes ('children'), plus the bytes actually read from and written to storage where the OS tells
+# ('io', from /proc/self/io on Linux). maxRSS is in kilobytes everywhere, times are in seconds.
+def _resource_usage_node():
+    resources = _record_node(None, 'resources', 'Resource usage of the run')
+    try:
+        import resource
+    except ImportError:  # Windows
+        return resources
+
+    rss_unit = 1024 if sys.platform == 'darwin' else 1  # bytes on OS X, kilobytes on Linux
+    for who, rusage_who in (('self', resource.RUSAGE_SELF), ('children', resource.RUSAGE_CHILDREN)):
+        usage = resource.getrusage(rusage_who)
+        node = _record_node(resources, who)
+        _record_item(node, 'userTime', 'double', '%.6f' % usage.ru_utime)
+        _record_item(node, 'systemTime', 'double', '%.6f' % usage.ru_stime)
+        for name, value in (('maxRSS', usage.ru_maxrss / rss_unit), ('inBlocks', usage.ru_inblock),
+                ('outBlocks', usage.ru_oublock), ('majorFaults', usage.ru_majflt),
+                ('voluntarySwitches', usage.ru_nvcsw), ('involuntarySwitches', usage.ru_nivcsw)):
+            _record_item(node, name, 'int', str(value))
+
+    try:
+        with open('/proc/self/io') as f:
+            counters = dict(line.split(':', 1) for line in f if ':' in line)
+        io = _record_node(resources, 'io')
+        _record_item(io, 'readBytes', 'int', counters['read_bytes'].strip())
+        _record_item(io, 'writeBytes', 'int', counters['write_bytes'].strip())
+    except (IOError, KeyError):
+        pass
+    return resources
+
+
+# Input file checksums are kept in a single cache file of the user's (see CTDopts' checksum_cache_dir),
+# never next to the files themselves: data directories may be read-only or shared, and files copied along
+# with a sidecar would take a stale digest with them. Every line is "sha256 <digest> <key>", the key being
+# the device, inode, size and mtime of the file the digest was computed from, and while those match the
+# digest is taken from there instead of hashing the file again. Lines are appended, one write each, so
+# concurrent runs can share the file; malformed lines are skipped. So that reading it stays cheap, it's
+# rewritten with the most recent _CHECKSUM_CACHE_SIZE entries once it has twice as many lines (a line a
+# concurrent run appends meanwhile may get lost, it's only a cache). Deleting it is always safe.
+_CHECKSUM_CHUNK_SIZE = 4 * 1024 * 1024
+_CHECKSUM_CACHE_SIZE = 4096
+
+
+def _user_cache_dir():
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+        'ctdopts')
+
+
+def _checksum_key(file_stat):
+    return '%d %d %d %r' % (file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime)
+
+
+class _ChecksumCache(object):
+    def __init__(self, cache_file):
+        import threading
+        self.cache_file = cache_file
+        self._digests = None  # by key, oldest first, read on first use
+        self._n_lines = 0  # in the file
+        self._lock = threading.Lock()
+
+    def _load(self):
+        self._digests = OrderedDict()
+        try:
+            with open(self.cache_file) as f:
+                for line in f:
+                    self._n_lines += 1
+                    fields = line.rstrip('\n').split(' ', 2)
+                    if len(fields) == 3 and fields[0] == 'sha256':
+                        self._digests.pop(fields[2], None)  # a later line is a more recent entry
+                        self._digests[fields[2]] = fields[1]
+        except IOError:  # no cache yet
+            pass
+
+    def get(self, key):
+        with self._lock:
+            if self._digests is None:
+                self._load()
+            return self._digests.get(key)
+
+    def put(self, key, digest):
+        with self._lock:
+            if self._digests is None:
+                self._load()
+            self._digests.pop(key, None)
+            self._digests[key] = digest
+            try:
+                cache_dir = os.path.dirname(self.cache_file)
+                if not os.path.isdir(cache_dir):
+                    os.makedirs(cache_dir, 0700)
+                if self._n_lines + 1 >= 2 * _CHECKSUM_CACHE_SIZE:
+                    recent = list(self._digests.iteritems())[-_CHECKSUM_CACHE_SIZE:]
+                    with _atomic_write(self.cache_file, 'w') as f:
+                        f.writelines('sha256 %s %s\n' % (entry_digest, entry_key) for entry_key, entry_digest in recent)
+                    self._digests = OrderedDict(recent)
+                    self._n_lines = len(recent)
+                else:
+                    with open(self.cache_file, 'a') as f:
+                        f.write('sha256 %s %s\n' % (digest, key))
+                    self._n_lines += 1
+            except (IOError, OSError):  # no cache then, the digest is just computed again next time
+                pass
+
+
+def _file_checksum(path, cache=None):
+    # (size, sha256 digest) of a file, from the _ChecksumCache if it's there, else hashed in large chunks
+    # (hashlib lets go of the GIL for those, so files are hashed in parallel) and added to it
+    with open(path, 'rb') as f:
+        file_stat = os.fstat(f.fileno())
+        key = _checksum_key(file_stat)
+        digest = cache.get(key) if cache is not None else None
+        if digest is not None:
+            return file_stat.st_size, digest
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: f.read(_CHECKSUM_CHUNK_SIZE), ''):
+            digest.update(chunk)
+    digest = digest.hexdigest()
+    if cache is not None:
+        cache.put(key, digest)
+    return file_stat.st_size, digest
+
+
+def _try_file_checksum(path, cache=None):
+    try:
+        return _file_checksum(path, cache)
+    except (IOError, OSError) as e:
+        return None, e.strerror or str(e)
+
+
+# Checksums of the input files of a run, computed in a background thread pool while the tool runs (see
+# CTDopts.start_input_checksums()). Written to the log CTD as an 'input_files' NODE with a NODE per file
+# (see _record_node()), for provenance.
+class _InputChecksums(object):
+    def __init__(self, files, threads=None, cache=None):
+        # files: parameter command line name: paths, see CTDopts._input_file_values(). cache: a _ChecksumCache
+        from multiprocessing.pool import ThreadPool
+        self.files = files
+        self._paths = list(set(path for paths in files.itervalues() for path in paths))
+        self._pool = ThreadPool(min(threads or 4, max(1, len(self._paths))))
+        self._checksums = self._pool.map_async(lambda path: _try_file_checksum(path, cache), self._paths,
+            chunksize=1)
+        self._pool.close()
+
+    def results(self):
+        # waits for the checksums, {path: (size, digest)} or (None, error message) for files that couldn't
+        # be read. (A timeout keeps the wait interruptible with Ctrl-C in Python 2.)
+        checksums = self._checksums.get(1e9)
+        self._pool.join()
+        return dict(zip(self._paths, checksums))
+
+    def xml_node(self):
+        results = self.results()
+        input_files = _record_node(None, 'input_files', 'Size and sha256 of the input files of the run')
+        for cl_name, paths in self.files.iteritems():
+            for path in paths:
+                size, digest = results[path]
+                input_file = _record_node(input_files, str(len(input_files) + 1))
+                _record_item(input_file, 'parameter', 'string', cl_name[1:])
+                _record_item(input_file, 'path', 'string', path)
+                if size is None:
+                    _record_item(input_file, 'error', 'string', digest)
+                else:
+                    _record_item(input_file, 'size', 'int', str(size))
+                    _record_item(input_file, 'sha256', 'string', digest)
+        return input_files
+
+
+# Periodically writes the log CTD of a running tool, so a run that gets killed (OOM, preemption, SIGKILL)
+# still leaves a record behind: the start time, the time of the checkpoint as stop time, executionStatus
+# RUNNING_STATUS and the last tail_bytes of captured stdout/stderr. The CTD is written to a temp file next
+# to the target that is then renamed over it, so readers never see a half written file. Everything but the
+# log and the execution record (see CTDopts._execution_node()) is serialized only once, at start(), and a
+# checkpoint is skipped if no output was captured since the last one. finalize_log() stops the checkpoints before writing the final CTD.
+class _LogCheckpointer(object):
+    RUNNING_STATUS = -1  # executionStatus is an xs:int, exit statuses are never negative
+
+    def __init__(self, opts, interval, tail_bytes=64 * 1024):
+        self.opts = opts
+        self.interval = interval
+        self.tail_bytes = tail_bytes
+        self._thread = None
+        self._last_state = None
+
+    def start(self):
+        import threading
+        from StringIO import StringIO
+        from xml.etree.ElementTree import Element
+        import tempfile
+
+        tool = self.opts.tool_xml_node
+        children = list(tool)
+        logs_index = [child.tag for child in children].index('logs')
+
+        # serialize the <tool> tag alone around a placeholder to get its opening and closing lines
+        marker = 'CTDOPTS_LOG_CHECKPOINT'
+        shell = Element(tool.tag, tool.attrib)
+        shell.text = marker
+        rendered = StringIO()
+        _write_pretty_xml(rendered, shell)
+        open_tag, close_tag = rendered.getvalue().split(marker)
+        open_tag += '\n'
+
+        prefix = StringIO()
+        prefix.write('<?xml version="1.0" ?>\n' + open_tag)
+        for child in children[:logs_index]:
+            _write_pretty_xml(prefix, child, '\t')
+        self._prefix = prefix.getvalue()
+
+        # what comes after the log (the parameters) can be big, it's kept in a temp file. The execution
+        # record (see CTDopts._execution_node()) goes at the end of the tool-named NODE in PARAMETERS,
+        # that is right before the closing tags of these two.
+        self._suffix = tempfile.TemporaryFile()
+        for child in children[logs_index + 1:]:
+            _write_pretty_xml(self._suffix, child, '\t')
+        closing = '\t\t</NODE>\n\t</PARAMETERS>\n'
+        self._suffix.seek(-len(closing), os.SEEK_END)
+        self._with_record = self._suffix.read() == closing
+        if self._with_record:
+            self._suffix.seek(-len(closing), os.SEEK_END)
+            self._suffix.truncate()
+            self._closing = closing + close_tag
+        else:
+            self._closing = close_tag  # no place for it, checkpoints go without
+
+        self._stop = threading.Event()
+        self.checkpoint()
+        self._thread = threading.Thread(target=self._run, name='CTDopts log checkpoints')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.checkpoint()
+            except (IOError, OSError) as e:
+                warnings.warn('Log checkpoint of %s failed: %s' % (self.opts.out_ctd_file, e))
+
+    def _stream(self, name):
+        stream = getattr(self.opts, name, None)
+        return stream if hasattr(stream, 'tail') else None
+
+    def checkpoint(self):
+        import shutil
+        from xml.etree.ElementTree import Element, SubElement
+
+        for tee_stream in getattr(self.opts, 'tee_streams', []):
+            tee_stream.hand_over()  # small outputs would otherwise sit in the tee's batch until exit
+        stdout, stderr = self._stream('stdout_stream'), self._stream('stderr_stream')
+        state = (stdout.total_size if stdout else 0, stderr.total_size if stderr else 0)
+        if state == self._last_state:
+            return
+
+        logs = Element('logs')
+        log = SubElement(logs, 'log', self.opts.log_node.attrib)
+        log.attrib['executionTimeStop'] = _utc_timestamp()
+        log.attrib['executionStatus'] = str(self.RUNNING_STATUS)
+        SubElement(log, 'executionErrors').text = stderr.tail(self.tail_bytes) if stderr else ''
+        SubElement(log, 'executionMessage').text = stdout.tail(self.tail_bytes) if stdout else ''
+        execution = self.opts._execution_node(input_checksums=False)
+
+        with _atomic_write(self.opts.out_ctd_file, ctd=True) as f:
+            f.write(self._prefix)
+            _write_pretty_xml(f, logs, '\t')
+            self._suffix.seek(0)
+            shutil.copyfileobj(self._suffix, f)
+            if execution is not None and self._with_record:
+                _write_pretty_xml(f, execution, '\t\t\t')
+            f.write(self._closing)
+        self._last_state = state
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+            self._suffix.close()
+
+
+# XML 1.0 has no way to hold control characters other than tab, newline and carriage return, not even as
+# character references. Tools do print them (ANSI color codes, backspaces in progress bars...), so they
+# are written as '?', and text nodes get a note saying how many were replaced.
+_XML_CONTROL_CHARS = ''.join(chr(code) for code in xrange(32) if chr(code) not in '\t\n\r')
+_XML_CONTROL_TABLE = ''.join('?' if chr(code) in _XML_CONTROL_CHARS else chr(code) for code in xrange(256))
+
+
+def _escape_xml_chunk(data):
+    # data escaped like _escape_xml_data() does it, and the number of control characters replaced
+    if isinstance(data, unicode):
+        data = data.encode('utf-8')
+    escaped = data.translate(_XML_CONTROL_TABLE)
+    n_replaced = 0
+    if escaped != data:  # UTF-8 sequences never contain bytes below 0x80, so they are left alone
+        n_replaced = len(data) - len(data.translate(None, _XML_CONTROL_CHARS))
+    escaped = escaped.replace('&', '&amp;').replace('<', '&lt;').replace('"', '&quot;').replace('>', '&gt;')
+    return escaped, n_replaced
+
+
+def _escape_xml_data(data):
+    # same escaping rules minidom's toprettyxml() applies to both attribute values and text nodes, plus
+    # control characters replaced (see above)
+    return _escape_xml_chunk(data)[0]
+
+
+def _write_xml_text(stream, text):
+    # text can also be a _CaptureBuffer (see finalize_log()), which we copy over chunk by chunk
+    n_replaced = 0
+    for chunk in text.iter_chunks() if hasattr(text, 'iter_chunks') else [text]:
+        escaped, n_chunk_replaced = _escape_xml_chunk(chunk)
+        stream.write(escaped)
+        n_replaced += n_chunk_replaced
+    if n_replaced:
+        stream.write('\n[%d control character%s replaced by ?]' % (n_replaced, 's' if n_replaced > 1 else ''))
+
+
+# Serializes an ElementTree element straight into an open file object, one line at a time. The output
+# is byte-identical to what parseString(tostring(element)).toprettyxml() used to produce (tab indent,
+# sorted attributes, single text children kept inline), but we don't need the serialized string, the
+# minidom DOM and the pretty-printed copy in memory all at once. Memory use beyond the element tree
+# is bounded by the nesting depth.
+# (replacements maps elements of the tree to ones written in their place, so a shared template tree
+# can be written with other values without being modified)
+def _write_pretty_xml(stream, element, indent='', addindent='\t', newl='\n', replacements=None):
+    parts = [indent, '<', element.tag]
+    for name in sorted(element.attrib):
+        parts.extend((' ', name, '="', _escape_xml_data(element.attrib[name]), '"'))
+
+    # minidom would see the element's text and the tails of its children as separate text nodes
+    text_nodes = [element.text] if element.text else []
+    if not len(element) and not text_nodes:
+        parts.extend(('/>', newl))
+        stream.write(''.join(parts))
+        return
+
+    parts.append('>')
+    if not len(element):
+        stream.write(''.join(parts))
+        _write_xml_text(stream, element.text)
+        stream.write(''.join(('</', element.tag, '>', newl)))
+        return
+
+    parts.append(newl)
+    if element.text:
+        parts.extend((indent, addindent, _escape_xml_data(element.text), newl))
+    stream.write(''.join(parts))
+
+    for child in element:
+        _write_pretty_xml(stream, replacements.get(child, child) if replacements else child, indent + addindent,
+            addindent, newl, replacements)
+        if child.tail:
+            stream.write(''.join((indent, addindent, _escape_xml_data(child.tail), newl)))
+
+    stream.write(''.join((indent, '</', element.tag, '>', newl)))
+
+
+# CTD and INI files are compressed or decompressed on the fly by extension, without temporary copies.
+_COMPRESSED_EXTENSIONS = ('.gz', '.bz2', '.xz')
+
+
+def _open_ctd(filename, mode='rb', name=None):
+    # A file object reading or writing a CTD, compressed according to name's extension (filename's by
+    # default, name is for temp files that get renamed to it). xz needs the lzma module, which Python 2
+    # only has with the backports.lzma package.
+    name = name or filename
+    if name.endswith('.gz'):
+        import gzip
+        return gzip.open(filename, mode, 6)  # (9, the default, is a lot slower for little gain)
+    if name.endswith('.bz2'):
+        import bz2
+        return bz2.BZ2File(filename, mode)
+    if name.endswith('.xz'):
+        try:
+            import lzma
+        except ImportError:
+            try:
+                from backports import lzma
+            except ImportError:
+                raise IOError('%s: xz compression needs the lzma module (pip install backports.lzma)' % name)
+        return lzma.open(filename, mode)
+    return open(filename, mode)
+
+
+def _strip_compression(filename):
+    # the name without a compression extension: x.ctd.gz -> x.ctd
+    for extension in _COMPRESSED_EXTENSIONS:
+        if filename.endswith(extension):
+            return filename[:-len(extension)]
+    return filename
+
+
+_umask = []  # the process' umask, read once (setting it to read it isn't thread safe)
+
+
+# Writes path through a temporary file in the same directory that's renamed over it once complete, so
+# concurrent readers never see a partial file: `with _atomic_write(path) as f: ...`. If the block raises,
+# the temporary file is removed and path left alone. The file gets the permissions open() would give it
+# (0666 minus the umask) instead of mkstemp()'s 0600. With ctd=True it's written through _open_ctd(), so
+# compressed by path's extension.
+@contextmanager
+def _atomic_write(path, mode='wb', ctd=False):
+    import tempfile
+    if not _umask:
+        _umask.append(os.umask(0))
+        os.umask(_umask[0])
+    handle, temp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.', suffix='.tmp')
+    try:
+        os.close(handle)
+        os.chmod(temp_file, 0666 & ~_umask[0])
+        with (_open_ctd(temp_file, mode, path) if ctd else open(temp_file, mode)) as f:
+            yield f
+        os.rename(temp_file, path)
+    except BaseException:
+        os.remove(temp_file)
+        raise
+
+
+# Parser target for _iter_ini_parameters(): it only records start and end tags with their attributes.
+# As it has no data() method the parser drops character data instead of building it up, so the text of
+# <logs> sections of earlier runs (captured output, possibly hundreds of MB) never takes up memory.
+# Parameter values are all in attributes.
+class _ParameterSectionTarget(object):
+    def __init__(self):
+        self.events = []  # (tag, attributes) for start tags, (tag, None) for end tags
+
+    def start(self, tag, attrib):
+        self.events.append((tag, attrib))
+
+    def end(self, tag):
+        self.events.append((tag, None))
+
+    def close(self):
+        pass
+
+
+# Streams (command line name, [values]) pairs out of a CTD/INI file's parameter section, feeding the file
+# to the parser in chunks, so we never hold the whole document nor any element tree: only the events of
+# the current chunk and the values of the ITEMLIST being read are kept. We stop reading once the
+# parameter section is over. Booleans are only registered if they are 'true', as [True]. Everything else
+# is left as strings.
+def _iter_ini_parameters(ini_file, chunk_size=64 * 1024):
+    try:  # the C accelerated parser is a lot faster at reading large parameter files
+        from xml.etree.cElementTree import XMLParser
+    except ImportError:
+        from xml.etree.ElementTree import XMLParser
+
+    target = _ParameterSectionTarget()
+    parser = XMLParser(target=target)
+    stack = []  # serial numbers of the currently open elements, document root first
+    n_elements = 0
+    param_depth = None  # depth of <PARAMETERS>
+    top_node = None  # serial number of the first <NODE> in <PARAMETERS> (OpenMS' tool-named node)
+    args_node = None  # serial number of the first <NODE> in top_node, its children are the actual parameters
+    group_names = []  # names of the <NODE>s we're in below args_node
+    list_name, list_values = None, None
+
+    with _open_ctd(ini_file) as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            parser.feed(chunk)
+            for tag, attrib in target.events:
+                # LISTITEMs can come in millions so they take a short cut: we take their value when they
+                # open, skipping all other bookkeeping.
+                if list_values is not None and tag == 'LISTITEM':
+                    if attrib is not None:
+                        list_values.append(attrib['value'])
+                    continue
+
+                if attrib is not None:
+                    n_elements += 1
+                    stack.append(n_elements)
+                    depth = len(stack)
+
+                    # for INI compatibility (which is an xml with the <PARAMETERS> node torn out of a CTD)
+                    # we accept <PARAMETERS> both as the root of the xml or as a child of <tool>
+                    if param_depth is None:
+                        if tag == 'PARAMETERS' and depth <= 2:
+                            param_depth = depth
+                    elif top_node is None:
+                        if tag == 'NODE' and depth == param_depth + 1:
+                            top_node = n_elements
+                    elif args_node is None:
+                        if tag == 'NODE' and depth == param_depth + 2 and stack[-2] == top_node:
+                            args_node = n_elements
+                    elif depth > param_depth + 2:
+                        full_name = '-' + ':'.join(group_names + [attrib.get('name', '')])
+                        if tag == 'NODE':
+                            group_names.append(attrib['name'])
+                        elif tag == 'ITEM':
+                            if attrib['type'] == 'boolean':
+                                if attrib['value'] == 'true':
+                                    yield full_name, [True]
+                            else:
+                                value = attrib['value']  # unicode if it's not ASCII
+                                yield full_name, [value.encode('utf-8') if isinstance(value, unicode) else value]
+                        elif tag == 'ITEMLIST':
+                            list_name, list_values = full_name, []
+                else:
+                    if stack.pop() == args_node:
+                        return  # parameter section is over, no need to read the rest of the file
+                    if args_node is not None:
+                        if tag == 'NODE':
+                            group_names.pop()
+                        elif tag == 'ITEMLIST':
+                            manifest, digest = _split_manifest_reference(list_values)
+                            if manifest is not None:  # relative to the CTD, not to where we're run from
+                                list_values = [_manifest_reference(os.path.join(
+                                    os.path.dirname(os.path.abspath(ini_file)), manifest), digest)]
+                            yield list_name, list_values
+                            list_name, list_values = None, None
+            del target.events[:]
+        parser.close()
+
+    if args_node is None:
+        raise ValueError('No parameter section found in %s' % ini_file)
+
+
+# Parameter values read from a binary sidecar (see CTDopts.write_param_sidecar()) are already cast, so
+# casting skips them and only checks them. Non-list parameters hold their single value.
+class _TypedValues(list):
+    __slots__ = ()
+
+
+# A param CTD's binary sidecar (see CTDopts.write_param_sidecar()) is a line of JSON describing the file
+# and listing the parameters, followed by the machine representation of every numeric list, in the order
+# they're listed, as raw array buffers. Unlike a pickle, loading it can't run any code, and the arrays are
+# read with array.fromfile() in one go.
+_SIDECAR_FORMAT = 'CTDopts param sidecar'
+_SIDECAR_VERSION = 2
+
+
+def _param_sidecar_file(ctd_file):
+    return ctd_file + '.sidecar'
+
+
+def _sidecar_header(definition_hash, ctd_file, parameters):
+    from array import array
+    return {'format': _SIDECAR_FORMAT, 'version': _SIDECAR_VERSION, 'byteorder': sys.byteorder,
+        'longSize': array('l').itemsize, 'definitionHash': definition_hash, 'ctdSha1': _file_sha1(ctd_file),
+        'parameters': parameters}
+
+
+def _json_string(value):
+    # json gives unicode, string parameters hold UTF-8 encoded str (like values read from the XML)
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+def _file_sha1(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# os.stat() results (or the OSError raised) by path, so checks of the same files never stat them twice
+# over slow network storage. One is made per CTDopts.check_input_files() call: files may be created or
+# change between calls, so neither results nor failures are kept beyond it. Entries are only ever added
+# whole, which the GIL makes safe across threads.
+class _StatCache(object):
+    def __init__(self):
+        self._results = {}
+
+    def stat(self, path):
+        result = self._results.get(path)
+        if result is None:
+            try:
+                result = os.stat(path)
+            except OSError as e:
+                result = e
+            self._results[path] = result
+        if isinstance(result, OSError):
+            raise result
+        return result
+
+
+# What files start with by extension, for sniffing their contents. Only formats whose files must start
+# with a magic number are sniffed (text formats like SAM or FASTA may begin with optional headers,
+# comments or blank lines), and only the last extension counts: a .fastq.gz file has to be gzip data.
+_COMPRESSION_MAGIC = {'gz': '\x1f\x8b', 'bz2': 'BZh', 'xz': '\xfd7zXZ\x00'}
+_FORMAT_MAGIC = dict(_COMPRESSION_MAGIC, bam='\x1f\x8b', cram='CRAM')  # (BAM is BGZF, a gzip variant)
+
+# the kinds of problems _check_input_file() finds, as worded in CTDopts.check_input_files()'s messages
+_FILE_PROBLEMS = OrderedDict([('missing', 'do not exist'), ('not_a_file', 'are not regular files'),
+    ('unreadable', 'are not readable'), ('empty', 'are empty'), ('wrong_content', "don't match their extension")])
+
+
+def _check_input_file(path, stat_cache, sniff=False):
+    # the kind of problem an input file has (see _FILE_PROBLEMS), or None
+    import stat
+    try:
+        file_stat = stat_cache.stat(path)
+    except OSError as e:
+        return 'missing' if e.errno in (errno.ENOENT, errno.ENOTDIR) else 'unreadable'
+    if not stat.S_ISREG(file_stat.st_mode):
+        return 'not_a_file'
+    if not file_stat.st_size:
+        return 'empty'
+    if not sniff:
+        return None if os.access(path, os.R_OK) else 'unreadable'
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(6)
+    except IOError:
+        return 'unreadable'
+    magic = _FORMAT_MAGIC.get(os.path.splitext(path)[1][1:].lower())
+    if magic is not None and not head.startswith(magic):
+        return 'wrong_content'
+    return None
+
+
+def _canonical_values(n_type, value):
+    # the strings a parameter value is fingerprinted by, see _parameter_fingerprint()
+    if value is None:
+        return ['null']
+    if isinstance(value, ManifestList):
+        return ['manifest', value.digest()]  # whatever its path, it's the contents that count
+    if isinstance(value, list):
+        return ['list', str(len(value))] + [part for v in value for part in _canonical_values(n_type, v)]
+    if n_type == bool:
+        return ['true' if value else 'false']
+    if n_type == float:
+        return [repr(float(value))]  # (round-trips, unlike str())
+    if n_type == int:
+        return [str(int(value))]
+    return [value.encode('utf-8') if isinstance(value, unicode) else str(value)]
+
+
+# A canonical digest of resolved parameter values, given as (full name, type, value) triples: sha256 of the
+# tool name and version and of every parameter's name, type and value, length-prefixed and sorted by name
+# so neither the definition order nor the command line order matters. With file_digests, the contents of
+# the files given to input_file_params (full names) count too, missing files as such. Their sha256 digests
+# come from checksum_cache (a _ChecksumCache) if there's one, so unchanged files aren't read again.
+def _parameter_fingerprint(tool_name, version, values, input_file_params=(), file_digests=False,
+        checksum_cache=None):
+    digest = hashlib.sha256()
+
+    def update(string):
+        digest.update('%d:%s' % (len(string), string))
+
+    update(tool_name)
+    update(version)
+    update('file_digests' if file_digests else 'names')
+    for full_name, n_type, value in sorted(values, key=lambda name_type_value: name_type_value[0]):
+        update(full_name)
+        update(n_type.__name__)
+        for part in _canonical_values(n_type, value):
+            update(part)
+        if file_digests and full_name in input_file_params and value is not None:
+            for filename in (value if isinstance(value, (list, ManifestList)) else [value]):
+                try:
+                    update(_file_checksum(filename, checksum_cache)[1])
+                except (IOError, OSError):
+                    update('missing')
+    return digest.hexdigest()
+
+
+# The fingerprint goes into CTDs as an advanced ITEM next to the 'version' one, outside the tool's actual
+# parameters like it, so it's valid against the published schemas and reading the CTD ignores it.
+def _fingerprint_node(fingerprint, file_digests):
+    from xml.etree.ElementTree import Element
+    return Element('ITEM', name='parameter_fingerprint', value=fingerprint, type='string', tags='advanced',
+        description='sha256 of the resolved parameter values%s, the same for runs with the same '
+            'configuration.' % (' and input file contents' if file_digests else ''))
+
+
+def _load_param_sidecar(ctd_file, definition_hash):
+    # The parameters of ctd_file as _iter_ini_parameters() would yield them (minus unset lists), but
+    # typed, from its sidecar. None if there's no sidecar, or it's for another version of the CTD, of
+    # the tool definition, of the format or for another machine's number representation.
+    import json
+    from array import array
+    sidecar_file = _param_sidecar_file(ctd_file)
+    if not os.path.exists(sidecar_file):
+        return None
+    try:
+        with open(sidecar_file, 'rb') as f:
+            header = json.loads(f.readline())
+            parameters = header.get('parameters')
+            if header != _sidecar_header(definition_hash, ctd_file, parameters):
+                return None
+            bound_params = OrderedDict()
+            for cl_name, typecode, values in parameters:
+                if typecode is None:  # the values themselves
+                    values = [_json_string(value) for value in values]
+                elif typecode in ('l', 'd'):  # the length of a packed numeric list
+                    packed = array(typecode)
+                    packed.fromfile(f, values)
+                    values = packed.tolist()
+                else:
+                    return None
+                bound_params[_json_string(cl_name)] = _TypedValues(values)
+    except Exception:  # unreadable, truncated, written by something else...: the XML is always there
+        return None
+    return bound_params
+
+
+def _cast_list(n_type, values):
+    # casts a whole list in one go, with NumPy for large lists of numbers if it's there. Raises ValueError
+    # naming the first invalid value.
+    numpy = n_type in (int, float) and len(values) >= _NUMPY_LIST_SIZE and _get_numpy()
+    if numpy:
+        try:
+            return numpy.array(values, dtype=n_type).tolist()
+        except (TypeError, ValueError, OverflowError):
+            pass  # the builtin cast below finds the culprit (or handles what NumPy couldn't)
+    try:
+        return map(n_type, values)
+    except (TypeError, ValueError):
+        if n_type is str:  # ElementTree gives unicode for non-ASCII text, which str() can't take
+            return [value.encode('utf-8') if isinstance(value, unicode) else value for value in values]
+        for value in values:
+            try:
+                n_type(value)
+            except (TypeError, ValueError):
+                raise ValueError(value)
+        raise
+
+
+_MANIFEST_CHUNK_SIZE = 4096  # values cast and checked at once
+
+
+def _manifest_reference(path, digest=None):
+    # how a manifest is given: `@path`, or `@path#sha256=<digest>` pinning its contents
+    return '@' + path + ('' if digest is None else '#sha256=' + digest)
+
+
+def _split_manifest_reference(values):
+    # (path, sha256 digest or None) of the manifest file of a list parameter given as `@path` (see
+    # _manifest_reference()), or (None, None)
+    if len(values) == 1 and isinstance(values[0], basestring) and values[0].startswith('@') and len(values[0]) > 1:
+        path, marker, digest = values[0][1:].rpartition('#sha256=')
+        if marker and path and len(digest) == 64 and not digest.strip('0123456789abcdef'):
+            return path, digest
+        return values[0][1:], None
+    return None, None
+
+
+# The value of a list parameter given as `@path` on the command line or in a CTD: its values are in a
+# manifest file, one per line (blank lines are skipped), gzip-compressed if the name ends in .gz. Nothing
+# is kept in memory: every iteration streams the file again, casting the values as they come. Parsing
+# checks them in a first pass (see check()): invalid values and choices raise ValueError with the line
+# number, range and file format problems are reported once. Param CTDs list
+# `@path#sha256=<digest>` as the only LISTITEM instead of the values themselves, the manifest's sha256 in
+# the value so the CTD stays valid against the published Param schema. The path is made absolute, so the
+# CTD works from anywhere; relative ones in CTDs are relative to the CTD (see _iter_ini_parameters()).
+class ManifestList(object):
+    def __init__(self, path, n_type=str, restrictions=None, choices=None, cl_name=None):
+        self.path = os.path.abspath(path)
+        self.n_type = n_type
+        self.restrictions = restrictions
+        self.choices = choices
+        self.cl_name = cl_name or path
+        self._length = None  # known after the first complete pass
+        self._checked = False
+        self._digest = None  # (size, mtime, sha256) of the manifest file
+
+    def reference(self):
+        return _manifest_reference(self.path, self.digest())
+
+    def digest(self):
+        # sha256 of the manifest file. It's kept for as long as the file's size and mtime don't change.
+        file_stat = os.stat(self.path)
+        if self._digest is None or self._digest[:2] != (file_stat.st_size, file_stat.st_mtime):
+            digest = hashlib.sha256()
+            with open(self.path, 'rb') as f:
+                for chunk in iter(lambda: f.read(_CHECKSUM_CHUNK_SIZE), ''):
+                    digest.update(chunk)
+            self._digest = (file_stat.st_size, file_stat.st_mtime, digest.hexdigest())
+        return self._digest[2]
+
+    def _lines(self):
+        if self.path.endswith('.gz'):
+            import gzip
+            manifest = gzip.open(self.path, 'rb')
+        else:
+            manifest = open(self.path, 'rb')
+        with manifest:
+            for line_number, line in enumerate(manifest, 1):
+                value = line.rstrip('\r\n')
+                if value:
+                    yield line_number, value
+
+    def _cast_chunk(self, chunk):
+        # chunk: [(line number, value string)]
+        try:
+            typed_values = _cast_list(self.n_type, [value for line_number, value in chunk])
+        except ValueError as e:
+            line_number = next(line_number for line_number, value in chunk if value == e.args[0])
+            raise ValueError('argument %s: invalid %s value: %r (%s, line %d)' %
+                (self.cl_name, self.n_type.__name__, e.args[0], self.path, line_number))
+        if self.choices is not None:
+            allowed = set(self.choices)
+            for (line_number, value), typed_value in zip(chunk, typed_values):
+                if typed_value not in allowed:
+                    raise ValueError('argument %s: invalid choice: %r (choose from %s) (%s, line %d)' %
+                        (self.cl_name, typed_value, ', '.join(map(repr, self.choices)), self.path, line_number))
+        return typed_values
+
+    def _iter_chunks(self, problems=None):
+        # the typed values chunk by chunk. On the first complete pass range and file format problems are
+        # counted, and then warned about or, given a problems list, appended to it.
+        from itertools import islice
+        checking = not self._checked and self.restrictions is not None
+        n_values = n_offending = 0
+        first_problem = None
+        lines = self._lines()
+        while True:
+            chunk = list(islice(lines, _MANIFEST_CHUNK_SIZE))
+            if not chunk:
+                break
+            typed_values = self._cast_chunk(chunk)
+            n_values += len(typed_values)
+            if checking:
+                for typed_value in typed_values:
+                    problem = self.restrictions.check(typed_value)
+                    if problem is not None:
+                        n_offending += 1
+                        first_problem = first_problem or problem
+            yield typed_values
+
+        self._length = n_values
+        if checking and not self._checked and n_offending:
+            problem = 'Parameter %s: %d of %d values in manifest %s failed checks. First: %s' % (
+                self.restrictions.param_name, n_offending, n_values, self.path, first_problem)
+            if problems is None:
+                warnings.warn(problem)
+            else:
+                problems.append(problem)
+        self._checked = True
+
+    def __iter__(self):
+        for typed_values in self._iter_chunks():
+            for typed_value in typed_values:
+                yield typed_value
+
+    def check(self, problems=None):
+        # One pass over the manifest when it's bound (see _cast_values()), so invalid values and choices
+        # raise ValueError while parsing instead of deep inside the tool, and range and file format
+        # problems are reported with the other parameters' (and then not again by iterating).
+        for typed_values in self._iter_chunks(problems):
+            pass
+
+    def __len__(self):
+        if self._length is None:
+            self._length = sum(1 for line in self._lines())
+        return self._length
+
+    def __nonzero__(self):
+        # without reading the whole manifest like len() would
+        return any(True for line in self._lines())
+
+    def __repr__(self):
+        return 'ManifestList(%r)' % self.path
+
+
+def _cast_values(cl_name, n_type, restrictions, choices, is_list, values, problems=None):
+    # Casts and checks values (strings from the command line or a CTD) like argparse would, raising
+    # ValueError with argparse's own wording if a value is invalid. Lists are cast and checked in bulk,
+    # with a single aggregated warning per parameter instead of one per offending value. Given a problems
+    # list, warnings are appended to it instead. A list given as `@path` becomes a ManifestList, whose
+    # values are checked here once (and its contents against the digest of `@path#sha256=<digest>`).
+    if is_list:
+        manifest, digest = _split_manifest_reference(values)
+        if manifest is not None:
+            if not os.path.isfile(manifest):
+                raise ValueError('argument %s: cannot read manifest %s' % (cl_name, manifest))
+            manifest_list = ManifestList(manifest, n_type, restrictions, choices, cl_name)
+            if digest is not None and manifest_list.digest() != digest:
+                raise ValueError('argument %s: manifest %s has changed since it was referenced (sha256 %s, '
+                    'expected %s)' % (cl_name, manifest, manifest_list.digest(), digest))
+            manifest_list.check(problems)
+            return manifest_list
+        try:
+            typed_values = list(values) if isinstance(values, _TypedValues) else _cast_list(n_type, values)
+        except ValueError as e:
+            raise ValueError('argument %s: invalid %s value: %r' % (cl_name, n_type.__name__, e.args[0]))
+        if choices is not None:
+            allowed = set(choices)
+            for typed_value in typed_values:
+                if typed_value not in allowed:
+                    raise ValueError('argument %s: invalid choice: %r (choose from %s)' %
+                        (cl_name, typed_value, ', '.join(map(repr, choices))))
+        if restrictions is not None:
+            problem = restrictions.check_all(typed_values)
+            if problem is not None:
+                if problems is None:
+                    warnings.warn(problem)
+                else:
+                    problems.append(problem)
+        return typed_values
+
+    # (sidecar values go through the cast too, it's a no-op on values of the right type but runs the checks)
+    cast = n_type if restrictions is None else restrictions.argparse_type(problems)
+    try:
+        typed_value = cast(values[0])
+    except (TypeError, ValueError):
+        raise ValueError('argument %s: invalid %s value: %r' %
+            (cl_name, getattr(cast, '__name__', repr(cast)), values[0]))
+    if choices is not None and typed_value not in choices:
+        raise ValueError('argument %s: invalid choice: %r (choose from %s)' %
+            (cl_name, typed_value, ', '.join(map(repr, choices))))
+    return typed_value
+
+
+# sets the value of an ITEM/ITEMLIST element
+def _set_xml_value(element, n_type, is_list, value):
+    from xml.etree.ElementTree import SubElement
+    if isinstance(value, ManifestList):  # referenced by path and digest instead of inlined
+        del element[:]
+        SubElement(element, 'LISTITEM', {'value': value.reference()})
+    elif is_list:
+        del element[:]
+        if value is not None:
+            for d in value:
+                SubElement(element, 'LISTITEM', {'value': str(d)})
+    elif n_type == bool:
+        element.set('value', 'true' if value else 'false')  # XS likes it lowercase
+    else:
+        element.set('value', '' if value is None else str(value))
 
 
 class ArgumentItem(object):
+    # definitions can have tens of thousands of parameters, so no per-instance __dict__.
+    # call_value is only set once the parameter was parsed (see store_call_value()).
+    __slots__ = ('name', 'parent', 'full_name', 'type', 'tags', 'required', 'description', 'is_list', 'default',
+        'choices', 'restrictions', '_call_value')
+
     def __init__(self, name, parent, **kwargs):
         self.name = name
         self.parent = parent
+        # colon separated name in the command line (and in the namespace), computed once
+        self.full_name = ':'.join(parent.lineage + [name])
         self.type = kwargs.get('type', str)
         self.tags = kwargs.get('tags', [])
         self.required = kwargs.get('required', False)
@@ -129,6 +1577,23 @@ class ArgumentItem(object):
         elif 'file_formats' in kwargs:
             self.restrictions = _FileFormat(self.name, kwargs['file_formats'])
 
+    @property
+    def call_value(self):
+        return self._call_value  # AttributeError until it's set, so hasattr() tells if it was
+
+    @call_value.setter
+    def call_value(self, value):
+        # the root group tracks whose value changed since CTDopts last generated the XML of the tree. Setting
+        # an equal value again doesn't count, unless it's the same list object (it may have been modified).
+        try:
+            old = self._call_value
+            unchanged = value == old and (value is not old or not isinstance(value, list))
+        except AttributeError:
+            unchanged = False
+        self._call_value = value
+        if not unchanged:
+            self.parent.root.dirty_items.add(self)
+
     def argparse_call(self):
         # return a dictionary to be keyword-fed to argparse's add_argument(name, **kws).
         kws = {}
@@ -145,6 +1610,13 @@ class ArgumentItem(object):
 
         if self.choices is not None:
             kws['choices'] = self.choices
+
+        # Lists are the exception: argparse would cast and check them one by one, warning separately about
+        # each offending value. So it leaves them as strings and CTDopts.parse_args() runs them through
+        # cast_value() which does the same in bulk.
+        if self.is_list:
+            del kws['type']
+            kws.pop('choices', None)
         if self.default is not None:
             kws['default'] = self.default
 
@@ -163,16 +1635,12 @@ class ArgumentItem(object):
 
         return kws
 
-    def xml_node(self):
-        value = self.call_value if hasattr(self, 'call_value') else self.default
+    def xml_node(self, item_elements=None):
+        from xml.etree.ElementTree import Element
 
         # name, value, type, description, tags, restrictions, supported_formats
         attribs = OrderedDict()
         attribs['name'] = self.name
-        if not self.is_list:
-            attribs['value'] = '' if value is None else str(value)
-            if self.type == bool:
-                attribs['value'] = 'true' if value else 'false'  # XS likes it lowercase
         attribs['type'] = {int: 'int', float: 'float', str: 'string', bool: 'boolean'}[self.type]
         attribs['description'] = self.description
         attribs['tags'] = ','.join(self.tags)
@@ -184,23 +1652,59 @@ class ArgumentItem(object):
         elif isinstance(self.restrictions, _FileFormat):
             attribs['supported_formats'] = self.restrictions.ctd_format_string()
 
-        if self.is_list:
-            top = Element('ITEMLIST', attribs)
-            if value is not None:
-                for d in value:
-                    SubElement(top, 'LISTITEM', {'value': str(d)})
-            return top
-        else:
-            return Element('ITEM', attribs)
+        top = Element('ITEMLIST' if self.is_list else 'ITEM', attribs)
+        self.update_xml_node(top)  # the value
+        if item_elements is not None:
+            item_elements[self] = top
+        return top
+
+    def update_xml_node(self, element):
+        # sets the value of an element made by xml_node() to the current one
+        value = self.call_value if hasattr(self, 'call_value') else self.default
+        _set_xml_value(element, self.type, self.is_list, value)
 
     def param_commandline_name(self):
         # for nested parameters, if the parameter is in paramgroup1 > subparamgroup1 > param1
         # then the command line param name should be -paramgroup1:subparamgroup1:param1
-        parent_groups = self.parent.get_group_lineage()
-        return (':'.join(parent_groups + [self.name]))
+        return self.full_name
+
+    def argparse_dest(self):
+        # the attribute name argparse stores the parameter under (it turns dashes into underscores)
+        return self.param_commandline_name().replace('-', '_')
 
-    def append_argument(self, argparse_instance):
-        argparse_instance.add_argument('-' + self.param_commandline_name(), **self.argparse_call())
+    def cast_value(self, values):
+        # Casts values read from a CTD (a list of strings, or [True] for set flags) the same way argparse
+        # would cast them from the command line: with self.type, or the restriction checker if there's
+        # one, and validating choices. Raises ValueError with argparse's own wording on failure.
+        if self.type == bool:
+            return True
+        return _cast_values('-' + self.param_commandline_name(), self.type, self.restrictions, self.choices,
+            self.is_list, values)
+
+    def compile(self):
+        # flat, picklable description of everything parsing needs, see _CompiledParameters
+        num_range = None
+        file_formats = None
+        if isinstance(self.restrictions, _NumericRange):
+            num_range = (self.restrictions.n_min, self.restrictions.n_max)
+        elif isinstance(self.restrictions, _FileFormat):
+            file_formats = self.restrictions.formats
+        return ('-' + self.param_commandline_name(), self.argparse_dest(), self.name, self.type, self.is_list,
+            self.required, self.default, self.choices, num_range, file_formats)
+
+    def append_argument(self, argparse_instance, bound_params=None):
+        import argparse
+        kws = self.argparse_call()
+        cl_name = '-' + self.param_commandline_name()
+        # parameters already bound from an input CTD are no longer required in the command line, and
+        # they mustn't get a default either so we can tell whether the command line overrode them.
+        if bound_params is not None and cl_name in bound_params:
+            kws['required'] = False
+            kws['default'] = argparse.SUPPRESS
+        argparse_instance.add_argument(cl_name, **kws)
+
+    def iter_items(self):
+        yield self
 
     def store_call_value(self, call_dict):
         cl_name = self.param_commandline_name()
@@ -209,36 +1713,63 @@ class ArgumentItem(object):
 
 
 class ArgumentGroup(object):
+    # root, item_table, definition_digest and dirty_items are shared by the whole tree: every group points
+    # to the root group, which holds the flat table, the digest and the set of changed items.
+    __slots__ = ('name', 'parent', 'description', 'arguments', 'lineage', 'root', 'item_table',
+        'definition_digest', 'dirty_items')
+
     def __init__(self, name, parent, description=""):
         self.name = name
         self.parent = parent
         self.description = description
         self.arguments = OrderedDict()
+        if parent is None:
+            self.lineage = []
+            self.root = self
+            # every ArgumentItem in the tree by full (colon separated) name, in order of definition
+            self.item_table = OrderedDict()
+            # running hash of all definition calls in the tree, see CTDopts.definition_hash()
+            self.definition_digest = hashlib.sha1()
+            # items whose call_value changed since their XML was generated, see CTDopts.generate_ctd_tree()
+            self.dirty_items = set()
+        else:
+            self.lineage = parent.lineage + [name]
+            self.root = parent.root
 
-    def add(self, name, **kwargs):
+    def _record_definition(self, *call):
+        self.root.definition_digest.update(repr(call))
+
+    def _replace(self, name, arg):
         if name in self.arguments:
-            warnings.warn('Name `%s` in subsection `%s` defined twice! Overriding first')
+            warnings.warn('Name `%s` in subsection `%s` defined twice! Overriding first' % (name, self.name))
+            # items of whatever we are overriding mustn't linger in the flat table
+            for item in self.arguments[name].iter_items():
+                self.root.item_table.pop(item.full_name, None)
+        self.arguments[name] = arg
 
-        self.arguments[name] = ArgumentItem(name, self, **kwargs)
+    def add(self, name, **kwargs):
+        item = ArgumentItem(name, self, **kwargs)
+        self._replace(name, item)
+        self.root.item_table[item.full_name] = item
+        self._record_definition('add', self.lineage, name, sorted(kwargs.items()))
 
     def add_group(self, name, description=""):
-        if name in self.arguments:
-            warnings.warn('Name `%s` in subsection `%s` defined twice! Overriding first')
-
-        self.arguments[name] = ArgumentGroup(name, self, description)
+        self._replace(name, ArgumentGroup(name, self, description))
+        self._record_definition('add_group', self.lineage, name, description)
         return self.arguments[name]
 
-    def xml_node(self):
+    def xml_node(self, item_elements=None):
+        # item_elements, if given, collects the element of every item by ArgumentItem
+        from xml.etree.ElementTree import Element
         top = Element('NODE', {'name': self.name, 'description': self.description})
-        # TODO: if an ArgumentItem comes after an ArgumentGroup, the CTD won't validate.
-        # Of course this should never happen if the argument tree is built properly but it would be
-        # nice to take care of it if a user happens to randomly define his arguments and groups.
-        # So first we could sort self.arguments (Items first, Groups after them).
+        # Param_1_6_2 lets ITEMs and NODEs mix in any order within a NODE (only directly in PARAMETERS
+        # would items have to come first), so arguments and groups are written as they were defined.
+        # CTDopts.validate_schema() checks the result against the schemas.
         for arg in self.arguments.itervalues():
-            top.append(arg.xml_node())
+            top.append(arg.xml_node(item_elements))
         return top
 
-    def append_argument(self, argparse_instance):
+    def append_argument(self, argparse_instance, bound_params=None):
         # argparse is buggy and won't display help messages for arguments that are doubly nested in
         # groups (although it parses them perfectly). So while it's possible and totally legal, one
         # should never call add_argument_group() on groups because it will ruin his help message
@@ -250,30 +1781,1154 @@ class ArgumentGroup(object):
         # so we need colon separated argument naming in non-top-level arguments.
         argparse_current = argparse_instance.add_argument_group(self.name, self.description)
         for name, arg in self.arguments.iteritems():
-            arg.append_argument(argparse_current)
+            arg.append_argument(argparse_current, bound_params)
+
+    def iter_items(self):
+        # all ArgumentItems in the subtree, depth first in definition order
+        for arg in self.arguments.itervalues():
+            for item in arg.iter_items():
+                yield item
 
     def store_call_value(self, call_dict):
         for name, arg in self.arguments.iteritems():
             arg.store_call_value(call_dict)
 
     def get_group_lineage(self):
-        if self.parent is None:
-            return []
+        return list(self.lineage)
+
+
+# A flat form of a parameter tree (see ArgumentItem.compile() for what an entry holds), plus a minimal
+# command line parser working from it. It only handles the plain `-name value(s)` and `-flag` syntax CTDopts
+# tools are called with. Anything else (help, abbreviations, unknown options, missing or invalid values...)
+# makes parse_args() return None, and the caller falls back to a full argparse parser, which then reports
+# the error or handles the request as usual.
+def _looks_like_negative_number(arg):
+    # argparse's rule for telling a negative number value from an option: ^-\d+$|^-\d*\.\d+$
+    number = arg[1:]
+    if number.isdigit():
+        return True
+    integer, dot, fraction = number.partition('.')
+    return bool(dot) and (not integer or integer.isdigit()) and fraction.isdigit()
+
+
+class _CompiledParameters(object):
+    def __init__(self, definition_hash, entries):
+        self.definition_hash = definition_hash
+        self.entries = entries
+        self.options = dict((entry[0], entry) for entry in entries)
+
+    def _restrictions(self, entry):
+        cl_name, dest, name, n_type, is_list, required, default, choices, num_range, file_formats = entry
+        if num_range is not None:
+            return _NumericRange(name, n_type, *num_range)
+        elif file_formats is not None:
+            return _FileFormat(name, file_formats)
+        return None
+
+    def parse_args(self, arg_strings, bound_params):
+        given = {}
+        current = None  # entry whose values we're collecting
+        for arg in arg_strings:
+            if arg in self.options:
+                entry = self.options[arg]
+                if entry[3] == bool:
+                    given[arg] = True
+                    current = None
+                else:
+                    current = entry
+                    given[arg] = []
+            elif current is None or (arg.startswith('-') and not _looks_like_negative_number(arg)):
+                return None
+            else:
+                given[current[0]].append(arg)
+                if not current[4]:  # non-list parameters take exactly one value
+                    current = None
+
+        if any(name not in self.options for name in bound_params):
+            return None
+
+        import argparse
+        namespace = argparse.Namespace()
+        for entry in self.entries:
+            cl_name, dest, name, n_type, is_list, required, default, choices, num_range, file_formats = entry
+            try:
+                if cl_name in given:
+                    if n_type == bool:
+                        value = True
+                    elif not given[cl_name]:
+                        return None
+                    else:
+                        value = _cast_values(cl_name, n_type, self._restrictions(entry), choices, is_list,
+                            given[cl_name])
+                elif cl_name in bound_params:
+                    value = True if n_type == bool else _cast_values(cl_name, n_type, self._restrictions(entry),
+                        choices, is_list, bound_params[cl_name])
+                elif required:
+                    return None
+                elif isinstance(default, basestring):
+                    # argparse runs string defaults through `type` too
+                    restrictions = self._restrictions(entry)
+                    value = n_type(default) if restrictions is None else restrictions.argparse_type()(default)
+                else:
+                    value = default
+            except ValueError:
+                return None
+            setattr(namespace, dest, value)
+        return namespace
+
+    def validate(self, bound_params):
+        # Checks parameter values read from a CTD without warning, exiting or stopping at the first
+        # problem. Returns a list of (parameter command line name, problem kind, message) tuples.
+        issues = []
+        for cl_name in bound_params:
+            if cl_name not in self.options:
+                issues.append((cl_name, 'unknown_parameter', 'Parameter %s is not defined by the tool' % cl_name))
+
+        for entry in self.entries:
+            cl_name, dest, name, n_type, is_list, required, default, choices, num_range, file_formats = entry
+            if cl_name not in bound_params:
+                if required:
+                    issues.append((cl_name, 'missing_required', 'Required parameter %s is not set' % cl_name))
+                continue
+            if n_type == bool:
+                continue
+
+            values = bound_params[cl_name]
+            manifest, digest = _split_manifest_reference(values) if is_list else (None, None)
+            if manifest is not None:  # checked like inlined values, below
+                try:
+                    manifest_list = ManifestList(manifest)
+                    values = list(manifest_list)
+                    if digest is not None and manifest_list.digest() != digest:
+                        issues.append((cl_name, 'invalid_value', 'Parameter %s manifest %s has changed since '
+                            'the CTD was written' % (cl_name, manifest)))
+                except (IOError, OSError) as e:
+                    issues.append((cl_name, 'invalid_value', 'Parameter %s manifest %s cannot be read: %s' %
+                        (cl_name, manifest, e.strerror or e)))
+                    continue
+            if not is_list and len(values) != 1:
+                issues.append((cl_name, 'invalid_value', 'Parameter %s takes a single value' % cl_name))
+            try:
+                typed_values = _cast_list(n_type, values)
+            except ValueError:  # collect every invalid value, keep checking the rest
+                typed_values = []
+                for value in values:
+                    try:
+                        typed_values.append(n_type(value))
+                    except (TypeError, ValueError):
+                        issues.append((cl_name, 'invalid_value', 'Parameter %s value %r is not a valid %s' %
+                            (cl_name, value, n_type.__name__)))
+
+            if choices is not None:
+                for value in typed_values:
+                    if value not in choices:
+                        issues.append((cl_name, 'invalid_choice', 'Parameter %s value %r not in allowed values: %s' %
+                            (cl_name, value, ', '.join(map(str, choices)))))
+
+            restrictions = self._restrictions(entry)
+            if restrictions is not None and typed_values:
+                # list parameters get a single aggregated issue
+                problem = restrictions.check_all(typed_values) if is_list else restrictions.check(typed_values[0])
+                if problem is not None:
+                    kind = 'out_of_range' if isinstance(restrictions, _NumericRange) else 'bad_extension'
+                    issues.append((cl_name, kind, problem))
+        return issues
+
+
+class CTDParseError(ValueError):
+    # what ToolParser.parse() raises where CTDopts.parse_args() would print an argparse error and exit
+    pass
+
+
+# What ToolParser.parse() returns: namespace is what CTDopts.parse_args() would have returned (None when
+# a tool CTD was asked for, that's all such a call does), values has every parameter's value by full name,
+# warnings the problems CTDopts.parse_args() would have warned about (out of range values, unsupported
+# file extensions) and ctd_outputs the ('tool' or 'param', filename) CTDs the command line asked for.
+# Those are only written by write_ctds().
+class ParseResult(object):
+    __slots__ = ('namespace', 'values', 'warnings', 'ctd_outputs', '_parser')
+
+    def __init__(self, parser, namespace, values, warnings, ctd_outputs):
+        self._parser = parser
+        self.namespace = namespace
+        self.values = values
+        self.warnings = warnings
+        self.ctd_outputs = ctd_outputs
+
+    def write_ctds(self):
+        for kind, filename in self.ctd_outputs:
+            self._parser.write_ctd(filename, self.values if kind == 'param' else None)
+
+    def fingerprint(self, file_digests=False):
+        # see CTDopts.parameter_fingerprint()
+        return self._parser.fingerprint(self.values, file_digests)
+
+
+# A compiled, immutable command line parser of a tool, made by CTDopts.compile_parser(). parse() takes
+# the same command lines as CTDopts.parse_args() but returns a ParseResult instead of exiting, printing,
+# writing files or redirecting sys.stdout/sys.stderr, raises CTDParseError on invalid ones, and keeps no
+# state between calls, so a single instance can serve any number of threads (a workflow engine or a
+# server validating parameter sets, say). Only the --input_ctd, --read_param_sidecar, --write_tool_ctd and
+# --write_param_ctd directives are supported: logging and validation ones act on the whole process.
+class ToolParser(object):
+    UNSUPPORTED_DIRECTIVES = ('write_param_sidecar', 'fingerprint_input_files', 'check_input_files',
+        'sniff_input_files', 'log_output', 'log_std_streams', 'log_capture_fds', 'log_checkpoint_interval',
+        'log_input_checksums', 'log_resources', 'log_max_bytes', 'log_truncate', 'log_memory_limit',
+        'validate_ctds', 'validate_schema', 'validate_processes', 'sweep', 'sweep_dir', 'sweep_processes')
+
+    def __init__(self, tool_name, version, definition_hash, entries, template, item_elements, input_file_params,
+            checksum_cache_dir=None):
+        import threading
+        self.tool_name = tool_name
+        self.version = version
+        self.definition_hash = definition_hash
+        self._compiled = _CompiledParameters(definition_hash, entries)
+        self._template = template  # the tool's CTD tree with default values
+        self._item_elements = item_elements  # full name: (template element, type, is_list)
+        self._input_file_params = input_file_params  # full names of parameters tagged 'input file'
+        self._checksum_cache_dir = checksum_cache_dir  # see CTDopts' checksum_cache_dir
+        self._tokenizer = None
+        self._tokenizer_lock = threading.Lock()
+
+    def parse(self, arg_strings):
+        directives, rest = self._split_directives(list(arg_strings))
+        if 'write_tool_ctd' in directives:
+            return ParseResult(self, None, None, [], [('tool', directives['write_tool_ctd'] or self.tool_name + '.ctd')])
+
+        # order of resolution is the same as CTDopts.parse_args(): command line > input CTD > default
+        bound_params = OrderedDict()
+        input_ctd = directives.get('input_ctd')
+        if input_ctd is not None:
+            sidecar_params = None
+            if directives.get('read_param_sidecar'):
+                sidecar_params = _load_param_sidecar(input_ctd, self.definition_hash)
+            if sidecar_params is not None:
+                bound_params = sidecar_params
+            else:
+                try:
+                    bound_params.update((name, values) for name, values in _iter_ini_parameters(input_ctd)
+                        if len(values))
+                except (IOError, SyntaxError, ValueError) as e:  # (ElementTree's ParseError is a SyntaxError)
+                    raise CTDParseError('argument --input_ctd: cannot read %s: %s' % (input_ctd, e))
+
+        problems = []
+        namespace, values = self._resolve(self._tokenize(rest), bound_params, problems)
+        ctd_outputs = [('param', directives['write_param_ctd'])] if directives.get('write_param_ctd') else []
+        return ParseResult(self, namespace, values, problems, ctd_outputs)
+
+    def write_ctd(self, filename, values=None):
+        # writes the tool CTD, or given values by full name (see ParseResult.values) a parameter CTD
+        from xml.etree.ElementTree import Element
+        tool = self._template
+        replacements = {}
+        if values is not None:
+            for full_name, value in values.iteritems():
+                template, n_type, is_list = self._item_elements[full_name]
+                element = Element(template.tag, dict(template.attrib))
+                _set_xml_value(element, n_type, is_list, value)
+                replacements[template] = element
+            # a shallow copy of the tool-named top NODE, with the fingerprint after the version ITEM
+            top_node = self._template.find('PARAMETERS/NODE')
+            replacement = Element(top_node.tag, dict(top_node.attrib))
+            replacement.extend(top_node[:-1])
+            replacement.append(_fingerprint_node(self.fingerprint(values), False))
+            replacement.append(top_node[-1])
+            replacements[top_node] = replacement
+        with _open_ctd(filename, 'wb') as f:
+            f.write('<?xml version="1.0" ?>\n')
+            _write_pretty_xml(f, tool, replacements=replacements)
+
+    def fingerprint(self, values, file_digests=False):
+        checksum_cache = None
+        if file_digests and self._checksum_cache_dir is not None:
+            checksum_cache = _ChecksumCache(os.path.join(self._checksum_cache_dir, 'checksums'))
+        return _parameter_fingerprint(self.tool_name, self.version, ((full_name, self._item_elements[full_name][1],
+            value) for full_name, value in values.iteritems()), self._input_file_params, file_digests, checksum_cache)
+
+    def _split_directives(self, arg_strings):
+        # picks out the directives CTDopts.parse_args()'s preparser would (also in --name=value form)
+        directives = {}
+        rest = []
+        i = 0
+        while i < len(arg_strings):
+            arg = arg_strings[i]
+            i += 1
+            name, equals, value = arg[2:].partition('=')
+            if not arg.startswith('--') or name not in ('input_ctd', 'write_param_ctd', 'write_tool_ctd',
+                    'read_param_sidecar'):
+                if arg.startswith('--') and name in self.UNSUPPORTED_DIRECTIVES:
+                    raise CTDParseError('argument --%s: not supported in-process, use CTDopts.parse_args()' % name)
+                rest.append(arg)
+                continue
+            if name == 'read_param_sidecar':
+                if equals:
+                    raise CTDParseError('argument --read_param_sidecar: ignored explicit argument %r' % value)
+                directives[name] = True
+                continue
+            if not equals:
+                # --write_tool_ctd takes an optional filename, the others exactly one
+                values = []
+                while i < len(arg_strings) and not arg_strings[i].startswith('-'):
+                    values.append(arg_strings[i])
+                    i += 1
+                    if name != 'write_tool_ctd':
+                        break
+                if not values and name != 'write_tool_ctd':
+                    raise CTDParseError('argument --%s: expected one argument' % name)
+                value = values[0] if values else None
+            directives[name] = value
+        return directives, rest
+
+    def _tokenize(self, arg_strings):
+        # Splits the command line into {command line name: [value strings]}. The plain `-name value(s)` and
+        # `-flag` syntax is handled right here, anything else (abbreviations, invalid command lines) by an
+        # argparse parser that knows the options but doesn't cast or check any values.
+        options = self._compiled.options
+        given = {}
+        current = None  # entry whose values we're collecting
+        for arg in arg_strings:
+            if arg in options:
+                entry = options[arg]
+                given[arg] = []
+                current = None if entry[3] == bool else entry
+            elif current is None or (arg.startswith('-') and not _looks_like_negative_number(arg)):
+                break
+            else:
+                given[current[0]].append(arg)
+                if not current[4]:  # non-list parameters take exactly one value
+                    current = None
+        else:
+            if all(values or options[cl_name][3] == bool for cl_name, values in given.iteritems()):
+                return given
+
+        namespace = self._argparse_tokenizer().parse_args(arg_strings)
+        given = {}
+        for cl_name, dest, name, n_type, is_list in (entry[:5] for entry in self._compiled.entries):
+            if hasattr(namespace, dest):
+                value = getattr(namespace, dest)
+                given[cl_name] = [] if n_type == bool else value if is_list else [value]
+        return given
+
+    def _argparse_tokenizer(self):
+        # built on first use, only read from afterwards
+        with self._tokenizer_lock:
+            if self._tokenizer is None:
+                import argparse
+
+                class RaisingArgumentParser(argparse.ArgumentParser):
+                    def error(self, message):
+                        raise CTDParseError(message)
+
+                tokenizer = RaisingArgumentParser(prog=self.tool_name, add_help=False)
+                for cl_name, dest, name, n_type, is_list in (entry[:5] for entry in self._compiled.entries):
+                    if n_type == bool:
+                        tokenizer.add_argument(cl_name, dest=dest, action='store_true', default=argparse.SUPPRESS)
+                    else:
+                        tokenizer.add_argument(cl_name, dest=dest, nargs='+' if is_list else None,
+                            default=argparse.SUPPRESS)
+                self._tokenizer = tokenizer
+            return self._tokenizer
+
+    def _resolve(self, given, bound_params, problems):
+        import argparse
+        unknown = [cl_name for cl_name in bound_params if cl_name not in self._compiled.options]
+        if unknown:
+            raise CTDParseError('unrecognized arguments: %s' % ' '.join(unknown))
+
+        namespace = argparse.Namespace()
+        values = OrderedDict()
+        for entry in self._compiled.entries:
+            cl_name, dest, name, n_type, is_list, required, default, choices, num_range, file_formats = entry
+            source = given[cl_name] if cl_name in given else bound_params.get(cl_name)
+            try:
+                if source is not None and n_type == bool:
+                    value = True
+                elif source is not None:
+                    value = _cast_values(cl_name, n_type, self._compiled._restrictions(entry), choices, is_list,
+                        source, problems)
+                elif required:
+                    raise CTDParseError('argument %s is required' % cl_name)
+                elif isinstance(default, basestring):
+                    # argparse runs string defaults through `type` too, but doesn't check their choices
+                    value = _cast_values(cl_name, n_type, self._compiled._restrictions(entry), None, False,
+                        [default], problems)
+                else:
+                    value = list(default) if isinstance(default, list) else default  # the parser's stays intact
+            except CTDParseError:
+                raise
+            except ValueError as e:
+                raise CTDParseError(str(e))
+            setattr(namespace, dest, value)
+            values[cl_name[1:]] = value
+        return namespace, values
+
+
+class NestedNamespace(object):
+    # Attribute style access to nested parameters on top of the flat namespace parse_args() returns:
+    # args.subparams.subsubsetting.param_3 instead of vars(args)['subparams:subsubsetting:param_3'].
+    # Nothing is copied, each level only looks up the definition of the group it stands for, and
+    # child namespaces are only built (then kept) when they are first accessed.
+    def __init__(self, group, flat_values):
+        self._group = group
+        self._flat_values = flat_values
+
+    def __getattr__(self, name):
+        # only called for names that aren't instance attributes yet, i.e. not yet built child namespaces
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, name):
+        arg = self._group.arguments[name]
+        if isinstance(arg, ArgumentGroup):
+            child = NestedNamespace(arg, self._flat_values)
+            self.__dict__[name] = child
+            return child
+        return self._flat_values[arg.argparse_dest()]
+
+    def __dir__(self):
+        return list(self._group.arguments)
+
+    def __repr__(self):
+        return 'NestedNamespace(%s)' % ', '.join(self._group.arguments)
+
+
+class ValidationReport(object):
+    # Outcome of checking one parameter CTD against a tool definition, see CTDopts.validate_ctds().
+    # issues is a list of (parameter command line name, problem kind, message) tuples, kinds being
+    # out_of_range, bad_extension, invalid_choice, missing_required, invalid_value, unknown_parameter,
+    # schema (the file doesn't conform to the CTD schema, see SchemaValidator) and unreadable (for files
+    # that couldn't be read or parsed at all).
+    def __init__(self, ctd_file, issues):
+        self.ctd_file = ctd_file
+        self.issues = issues
+
+    @property
+    def valid(self):
+        return not self.issues
+
+    def __str__(self):
+        if self.valid:
+            return '%s: OK' % self.ctd_file
+        return '\n'.join(['%s: %d problem(s)' % (self.ctd_file, len(self.issues))] +
+            ['  %s [%s] %s' % (name or '(file)', kind, message) for name, kind, message in self.issues])
+
+
+# The subset of the bundled CTD_0_3.xsd (which includes Param_1_6_2.xsd) that CTDopts reads and writes,
+# as tables: for every complex type its attributes (simple type name, '!' if required), its content model
+# (a regular expression over child element names) and the types of its children. Simple types are
+# in _SIMPLE_TYPES, elements of a simple type only hold text.
+_XSI_NAMESPACE = '{http://www.w3.org/2001/XMLSchema-instance}'
+
+_SCHEMA_TYPES = {
+    'tool': ({'version': 'string!', 'name': 'toolName', 'docurl': 'anyURI', 'category': 'string'},
+        'manual? description? executableName? executablePath? cli? logs? relocators? PARAMETERS',
+        {'manual': 'string', 'description': 'string', 'executableName': 'string', 'executablePath': 'anyURI',
+            'cli': 'cli', 'logs': 'logs', 'relocators': 'relocators', 'PARAMETERS': 'PARAMETERS'}),
+    'cli': ({}, 'clielement+', {'clielement': 'clielement'}),
+    'clielement': ({'optionIdentifier': 'string', 'isList': 'boolean', 'required': 'boolean'},
+        'mapping*', {'mapping': 'mapping'}),
+    'mapping': ({'referenceName': 'string', 'referenceID': 'NCName'}, '', {}),
+    'logs': ({}, 'log+', {'log': 'log'}),
+    'log': ({'executionTimeStart': 'dateTime!', 'executionTimeStop': 'dateTime!', 'executionStatus': 'int!'},
+        'executionWarnings* executionErrors* executionMessage*',
+        {'executionWarnings': 'string', 'executionErrors': 'string', 'executionMessage': 'string'}),
+    'relocators': ({}, 'relocator', {'relocator': 'relocator'}),
+    'relocator': ({}, 'reference location', {'reference': 'string', 'location': 'string'}),
+    'PARAMETERS': ({'version': 'versionString'}, '(ITEM|ITEMLIST)* NODE*',
+        {'ITEM': 'ITEM', 'ITEMLIST': 'ITEMLIST', 'NODE': 'NODE'}),
+    'NODE': ({'name': 'nonEmptyString!', 'description': 'string'}, '(ITEM|ITEMLIST|NODE)*',
+        {'ITEM': 'ITEM', 'ITEMLIST': 'ITEMLIST', 'NODE': 'NODE'}),
+    'ITEMLIST': ({'name': 'nonEmptyString!', 'type': 'itemType!', 'description': 'string', 'tags': 'string',
+        'restrictions': 'string', 'supported_formats': 'string', 'required': 'boolean', 'advanced': 'boolean'},
+        'LISTITEM*', {'LISTITEM': 'LISTITEM'}),
+    'LISTITEM': ({'value': 'string!'}, '', {}),
+}
+_SCHEMA_TYPES['ITEM'] = (dict(_SCHEMA_TYPES['ITEMLIST'][0], value='string!'), '', {})
+_SCHEMA_ROOTS = {'tool': 'tool', 'PARAMETERS': 'PARAMETERS'}  # a CTD, or an INI file
+
+
+# XSD simple types as (regular expression, whether whitespace is collapsed before matching), compiled by
+# SchemaValidator. Most types collapse whitespace, xs:string and its restrictions don't.
+_SIMPLE_TYPES = {
+    'string': (r'.*', False),
+    'anyURI': (r'.*', False),
+    'nonEmptyString': (r'.+', False),
+    'toolName': (r'\w*', False),  # XSD's \w, not Python's, see _compile_simple_type()
+    'versionString': (r'\d+\.\d+(\.\d+)?', False),
+    'NCName': (r'[A-Za-z_][\w.-]*', True),
+    'boolean': (r'true|false|1|0', True),
+    'int': (r'[+-]?\d+', True),  # and within 32 bits
+    'dateTime': (r'-?\d{4,}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d+)?(Z|[+-]\d\d:\d\d)?', True),
+    'itemType': (r'int|double|boolean|float|string|int-pair|double-pair|output-prefix|input-file|output-file', True),
+}
+
+
+def _compile_simple_type(name):
+    # a function telling whether a value is valid for the simple type
+    import re
+    pattern, collapse = _SIMPLE_TYPES[name]
+    match = re.compile('(?:%s)\\Z' % pattern, re.DOTALL).match
+    if name == 'toolName':
+        # XSD's \w is any character but punctuation (_ and - too), separators and control characters
+        import unicodedata
+        return lambda value: all(unicodedata.category(char)[0] not in 'PZC'
+            for char in (value.decode('utf-8') if isinstance(value, str) else value))
+    if name == 'int':
+        return lambda value: match(value.strip()) is not None and -2 ** 31 <= int(value) < 2 ** 31
+    if collapse:
+        return lambda value: match(value.strip()) is not None
+    return lambda value: match(value) is not None
+
+
+class _CompiledType(object):
+    __slots__ = ('name', 'attributes', 'required', 'children', 'codes', 'model', 'model_source')
+
+    def __init__(self, name, attributes, model, children, simple_types):
+        import re
+        self.name = name
+        self.attributes = dict((attribute, simple_types[type_name.rstrip('!')])
+            for attribute, type_name in attributes.iteritems())
+        self.required = sorted(attribute for attribute, type_name in attributes.iteritems()
+            if type_name.endswith('!'))
+        self.children = children
+        # every child element name becomes one character, so the content model is a plain regex
+        self.codes = dict((tag, chr(ord('A') + i)) for i, tag in enumerate(sorted(children)))
+        self.model_source = model
+        self.model = re.compile(re.sub(r'[A-Za-z]+', lambda match: self.codes[match.group()], model).replace(' ', '') +
+            '\\Z')
+
+
+class _ValidationState(object):
+    # Event driven checker shared by SchemaValidator.validate() and validate_element(). Every open element
+    # has a frame: its compiled type (or simple type name, or None below an element that's already been
+    # reported), the codes of its children so far and its label for error messages.
+    def __init__(self, validator):
+        self.types = validator.types
+        self.simple_types = validator.simple_types
+        self.errors = []
+        self.frames = []
+
+    def error(self, message):
+        self.errors.append('/%s: %s' % ('/'.join(frame[2] for frame in self.frames), message))
+
+    def start(self, tag, attrib):
+        if not self.frames:
+            type_name = _SCHEMA_ROOTS.get(tag)
+            if type_name is None:
+                self.errors.append('/%s: root element must be tool or PARAMETERS' % tag)
         else:
-            return self.parent.get_group_lineage() + [self.name]
+            parent = self.frames[-1][0]
+            type_name = None
+            if isinstance(parent, _CompiledType):
+                type_name = parent.children.get(tag)
+                if type_name is None:
+                    self.error('element %s is not allowed here' % tag)
+                else:
+                    self.frames[-1][1].append(parent.codes[tag])
+            elif parent is not None:
+                self.error('element %s is not allowed in a text only element' % tag)
+
+        kind = self.types.get(type_name, type_name)
+        self.frames.append((kind, [], '%s[%s]' % (tag, attrib['name']) if 'name' in attrib else tag))
+        if isinstance(kind, _CompiledType):
+            for name, value in attrib.iteritems():
+                if name.startswith(_XSI_NAMESPACE) or name.startswith('xsi:') or name.startswith('xmlns'):
+                    continue  # namespace declarations and schema locations
+                check = kind.attributes.get(name)
+                if check is None:
+                    self.error('attribute %s is not allowed' % name)
+                elif not check(value):
+                    self.error('invalid value %r for attribute %s' % (value, name))
+            for name in kind.required:
+                if name not in attrib:
+                    self.error('required attribute %s is missing' % name)
+        elif kind is not None and attrib:
+            self.error('text only element can\'t have attributes')
+
+    def text(self, text):
+        kind = self.frames[-1][0]
+        if hasattr(text, 'iter_chunks'):
+            # captured output (see finalize_log()) that's never held as one string. xs:string takes any
+            # text, so there's nothing to read for checking it, other types get the joined chunks.
+            if kind in ('string', 'anyURI'):
+                return
+            text = ''.join(text.iter_chunks())
+        if isinstance(kind, _CompiledType):
+            if text and not text.isspace():
+                self.error('text is not allowed here')
+        elif kind is not None and not self.simple_types[kind](text or ''):
+            self.error('invalid %s %r' % (kind, text))
+
+    def end(self):
+        kind, codes = self.frames[-1][:2]
+        if isinstance(kind, _CompiledType) and not kind.model.match(''.join(codes)):
+            tags = dict((code, tag) for tag, code in kind.codes.iteritems())
+            found = ' '.join(tags[code] for code in codes[:10]) + (' ...' if len(codes) > 10 else '')
+            self.error('content must be "%s", found "%s"' % (kind.model_source, found))
+        self.frames.pop()
+
+
+class SchemaValidator(object):
+    # Checks CTD and INI (parameters only) documents against the schema subset above, without an XSD
+    # library. The tables are compiled in the constructor, so one instance is meant to check any number
+    # of documents (CTDopts keeps one, see _schema_validator()). validate() streams files, so huge
+    # ITEMLISTs are fine, validate_element() checks a tree in memory like CTDopts.tool_xml_node. Both
+    # return a list of problems, each one prefixed with the path of the element, empty if it's valid.
+    def __init__(self):
+        self.simple_types = dict((name, _compile_simple_type(name)) for name in _SIMPLE_TYPES)
+        self.types = dict((name, _CompiledType(name, attributes, model, children, self.simple_types))
+            for name, (attributes, model, children) in _SCHEMA_TYPES.iteritems())
+
+    def validate(self, source):
+        # source is a file name (of a compressed file too, see _open_ctd()) or a file object
+        if isinstance(source, basestring):
+            try:
+                ctd_file = _open_ctd(source)
+            except IOError as e:
+                return [str(e)]
+            with ctd_file:
+                return self.validate(ctd_file)
+
+        try:  # the C accelerated parser is a lot faster at reading large parameter files
+            from xml.etree.cElementTree import iterparse, ParseError
+        except ImportError:
+            from xml.etree.ElementTree import iterparse, ParseError
+
+        state = _ValidationState(self)
+        itemlist_type = self.types['ITEMLIST']
+        elements = []  # open elements
+        closed = []  # per open element: its last closed child, whose tail is only complete once we're past it
+        listitem = None  # LISTITEMs can come in millions, plain ones skip the checker (see below)
+        try:
+            for event, element in iterparse(source, events=('start', 'end')):
+                if event == 'start':
+                    if listitem is not None:  # a LISTITEM with children after all, check it properly
+                        state.start(listitem.tag, listitem.attrib)
+                        elements.append(listitem)
+                        closed.append(None)
+                        listitem = None
+                    if closed and closed[-1] is not None:
+                        state.text(closed[-1].tail)
+                        elements[-1].remove(closed[-1])
+                        closed[-1] = None
+                    # LISTITEM* is the content of an ITEMLIST, so a LISTITEM there with nothing but a
+                    # value attribute (and no text or children, checked when it ends) is valid
+                    if (element.tag == 'LISTITEM' and state.frames and state.frames[-1][0] is itemlist_type and
+                            element.attrib.keys() == ['value']):
+                        listitem = element
+                        continue
+                    state.start(element.tag, element.attrib)
+                    elements.append(element)
+                    closed.append(None)
+                elif element is listitem:
+                    listitem = None
+                    if element.text and not element.text.isspace():
+                        state.start(element.tag, element.attrib)
+                        state.text(element.text)
+                        state.end()
+                    closed[-1] = element
+                else:
+                    # (no element.clear() here, cElementTree wouldn't set the tail of a cleared element)
+                    last_child = closed.pop()
+                    if last_child is not None:
+                        state.text(last_child.tail)
+                        element.remove(last_child)
+                    state.text(element.text)
+                    state.end()
+                    elements.pop()
+                    if closed:
+                        closed[-1] = element
+        except (ParseError, SyntaxError) as e:
+            state.errors.append('not well-formed XML: %s' % e)
+        except (IOError, OSError) as e:
+            state.errors.append(str(e))
+        return state.errors
+
+    def validate_element(self, element):
+        state = _ValidationState(self)
+
+        def walk(element):
+            state.start(element.tag, element.attrib)
+            for child in element:
+                walk(child)
+                state.text(child.tail)
+            state.text(element.text)
+            state.end()
+        walk(element)
+        return state.errors
+
+
+_schema_validator_instance = None
+
+
+def _schema_validator():
+    # the shared SchemaValidator, compiled on first use (per process, batch validation workers too)
+    global _schema_validator_instance
+    if _schema_validator_instance is None:
+        _schema_validator_instance = SchemaValidator()
+    return _schema_validator_instance
+
+
+# Batch validation runs in a process pool. Every worker gets the compiled (so picklable) parameter tree
+# once at startup, instead of it being sent along with every file.
+_worker_parameters = None
+
+
+def _init_validation_worker(entries):
+    global _worker_parameters
+    _worker_parameters = _CompiledParameters(None, entries)
+
+
+def _validate_ctd_file(ctd_file):
+    try:
+        bound_params = OrderedDict((name, values) for name, values in _iter_ini_parameters(ctd_file) if len(values))
+    except Exception as e:  # missing file, broken XML, no parameter section...
+        return ValidationReport(ctd_file, [(None, 'unreadable', str(e))])
+    schema_issues = [(None, 'schema', message) for message in _schema_validator().validate(ctd_file)]
+    return ValidationReport(ctd_file, schema_issues + _worker_parameters.validate(bound_params))
+
+
+# Parameter sweeps, see CTDopts.sweep(). A spec is a dict (the same as the JSON file --sweep reads) of
+#   'grid': {full name: [values]}                      every combination of the values
+#   'zip': {full name: [values]}                        the i-th values of all lists together (same lengths)
+#   'random': {'samples': n, 'seed': s, 'parameters': {full name: {'uniform': [low, high]} or {'choice': [values]}}}
+# and the sweep runs through every combination of the grid, zip and random parts. The grid is enumerated
+# lazily, zip and random parts are small enough to be held.
+def _sweep_string(value):
+    # how a swept value is cast and checked like one from the command line (repr() keeps floats exact).
+    # JSON strings are unicode, command line arguments UTF-8 encoded bytes.
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, str):
+        return value
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _check_sweep_value(compiled, entry, value):
+    # value cast and checked against the parameter's restrictions like a command line value, out of range
+    # values and unsupported file extensions included. Raises ValueError.
+    cl_name, dest, name, n_type, is_list, required, default, choices, num_range, file_formats = entry
+    if n_type == bool:
+        if not isinstance(value, bool):
+            raise ValueError('sweep of %s: %r is not a boolean' % (cl_name, value))
+        return value
+    if is_list and not isinstance(value, list):
+        raise ValueError('sweep of %s: %r is not a list' % (cl_name, value))
+    strings = map(_sweep_string, value) if is_list else [_sweep_string(value)]
+    problems = []
+    try:
+        typed_value = _cast_values(cl_name, n_type, compiled._restrictions(entry), choices, is_list, strings, problems)
+    except ValueError as e:
+        raise ValueError('sweep: %s' % e)
+    if problems:
+        raise ValueError('sweep of %s: %s' % (cl_name, problems[0]))
+    return typed_value
+
+
+def _is_number(value):
+    return isinstance(value, (int, long, float)) and not isinstance(value, bool)
+
+
+def _sweep_kinds(spec):
+    # (grid, zip, random, random parameters, swept names) of a spec, checked for its shape (not its
+    # values, see _sweep_parts()) so malformed specs raise ValueError instead of KeyError or TypeError
+    if not isinstance(spec, dict):
+        raise ValueError('sweep: the spec must be an object of grid, zip and random')
+    unknown_kinds = set(spec) - set(['grid', 'zip', 'random'])
+    if unknown_kinds:
+        raise ValueError('sweep: unknown kinds %s (use grid, zip and random)' % ', '.join(sorted(unknown_kinds)))
+    grid = spec.get('grid', {})
+    zipped = spec.get('zip', {})
+    randomized = spec.get('random', {})
+    for kind, values_by_name in (('grid', grid), ('zip', zipped)):
+        if not isinstance(values_by_name, dict):
+            raise ValueError('sweep: %s must map parameter names to lists of values' % kind)
+        for name, values in values_by_name.iteritems():
+            if not isinstance(values, list):
+                raise ValueError('sweep: %s values of %s must be a list' % (kind, name))
+    if not isinstance(randomized, dict) or not isinstance(randomized.get('parameters', {}), dict):
+        raise ValueError('sweep: random must be {"samples": n, "seed": s, "parameters": {name: distribution}}')
+    random_parameters = randomized.get('parameters', {})
+    if random_parameters:
+        samples = randomized.get('samples')
+        if not isinstance(samples, (int, long)) or isinstance(samples, bool) or samples < 0:
+            raise ValueError('sweep: random needs a number of "samples"')
+    for name, distribution in random_parameters.iteritems():
+        if isinstance(distribution, dict) and len(distribution) == 1:
+            choices = distribution.get('choice')
+            bounds = distribution.get('uniform')
+            if isinstance(choices, list) and choices:
+                continue
+            if isinstance(bounds, list) and len(bounds) == 2 and all(map(_is_number, bounds)):
+                continue
+        raise ValueError('sweep: random distribution of %s must be {"choice": [values]} or '
+            '{"uniform": [low, high]}' % name)
+    names = list(grid) + list(zipped) + list(random_parameters)
+    return grid, zipped, randomized, random_parameters, names
+
+
+def _sweep_parts(spec, compiled):
+    # the checked (grid values by name, zip combinations, random combinations) of a spec
+    import random
+    options = dict((entry[0][1:], entry) for entry in compiled.entries)
+
+    def check(name, value):
+        return _check_sweep_value(compiled, options[name], value)
+
+    grid, zipped, randomized, random_parameters, names = _sweep_kinds(spec)
+    for name in names:
+        if name not in options:
+            raise ValueError('sweep: %s is not a parameter of the tool' % name)
+        if names.count(name) > 1:
+            raise ValueError('sweep: %s is swept more than once' % name)
+
+    grid_values = OrderedDict((name, [check(name, value) for value in values])
+        for name, values in sorted(grid.iteritems()))
+
+    zip_combinations = [OrderedDict()]
+    if zipped:
+        lengths = set(len(values) for values in zipped.itervalues())
+        if len(lengths) > 1:
+            raise ValueError('sweep: zipped parameters need the same number of values, got %s' %
+                ', '.join('%s: %d' % (name, len(values)) for name, values in sorted(zipped.iteritems())))
+        zip_combinations = [OrderedDict((name, check(name, zipped[name][i]))
+            for name in sorted(zipped)) for i in xrange(lengths.pop())]
+
+    random_combinations = [OrderedDict()]
+    if random_parameters:
+        generator = random.Random(randomized.get('seed'))
+        random_combinations = []
+        for _ in xrange(randomized['samples']):
+            combination = OrderedDict()
+            for name, distribution in sorted(random_parameters.iteritems()):
+                if 'choice' in distribution:
+                    value = generator.choice(distribution['choice'])
+                elif options[name][3] == int:
+                    low, high = distribution['uniform']
+                    if int(low) != low or int(high) != high:
+                        raise ValueError('sweep: uniform bounds of integer parameter %s must be integers' % name)
+                    value = generator.randint(int(low), int(high))
+                else:
+                    value = generator.uniform(*distribution['uniform'])
+                combination[name] = check(name, value)
+            random_combinations.append(combination)
+    return grid_values, zip_combinations, random_combinations
+
+
+def _sweep_combinations(spec, compiled):
+    from itertools import product
+    grid_values, zip_combinations, random_combinations = _sweep_parts(spec, compiled)
+    for grid_combination in product(*grid_values.values()):
+        for zip_combination in zip_combinations:
+            for random_combination in random_combinations:
+                combination = OrderedDict(zip(grid_values, grid_combination))
+                combination.update(zip_combination)
+                combination.update(random_combination)
+                yield combination
+
+
+# Sweep CTDs are written in a process pool whose workers inherit a ToolParser and the values of the
+# parameters that aren't swept at startup (by fork(), ToolParsers can't be pickled).
+_sweep_worker = None
+
+
+def _init_sweep_worker(parser, base_values, out_dir, prefix, extension):
+    global _sweep_worker
+    _sweep_worker = (parser, base_values, out_dir, prefix, extension)
+
+
+def _write_sweep_ctd(index_combination):
+    # writes the param CTD of a combination, returns its file name and parameter fingerprint
+    index, combination = index_combination
+    parser, base_values, out_dir, prefix, extension = _sweep_worker
+    values = OrderedDict(base_values)
+    values.update(combination)
+    filename = '%s%06d%s' % (prefix, index, extension)
+    parser.write_ctd(os.path.join(out_dir, filename), values)
+    return filename, parser.fingerprint(values)
+
+
+def _expand_ctd_paths(paths):
+    # directories stand for the *.ctd and *.ini files in them (compressed ones too), anything else is a
+    # glob pattern
+    import glob
+    if isinstance(paths, basestring):
+        paths = [paths]
+    ctd_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            ctd_files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                if _strip_compression(name).endswith(('.ctd', '.ini'))))
+        else:
+            ctd_files.extend(sorted(glob.glob(path)) or [path])  # keep non-matching names to report them
+    return ctd_files
 
 
 class CTDopts(object):
     def __init__(self, name, version, **kwargs):
         self.name = name
         self.version = version
+        # where input file checksums are cached (None: nowhere), see _ChecksumCache
+        self.checksum_cache_dir = kwargs.pop('checksum_cache_dir', _user_cache_dir())
         self.optional_attribs = kwargs  # description, manual, docurl, category (+executable stuff).
         self.main_node = ArgumentGroup('1', None, 'Instance "1" section for %s' % self.name)  # OpenMS legacy?
+        self.phase_timer = _PhaseTimer()
+        self.log_resources = False  # --log_resources: phase timings and resource usage in the log node
+        self._parameter_xml_cache = None  # (definition digest, XML, elements by item), see _parameter_xml_node()
+        self.fingerprint_file_digests = False  # --fingerprint_input_files
+
+    def phase(self, name):
+        # times a phase of the tool for the log CTD, as a context manager or a function decorator:
+        #   with tool_opts.phase('alignment'): ...    or    @tool_opts.phase('alignment')
+        return _Phase(self.phase_timer, name)
+
+    def definition_hash(self):
+        # the root group keeps a running digest of every add()/add_group() call, so this is cheap
+        digest = self.main_node.definition_digest.copy()
+        digest.update(repr((self.name, self.version, sorted(self.optional_attribs.items()))))
+        return digest.hexdigest()
+
+    def get_compiled_parameters(self):
+        # the flat parameter tree, rebuilt whenever the definition changes
+        definition_hash = self.definition_hash()
+        compiled = getattr(self, '_compiled_parameters', None)
+        if compiled is None or compiled.definition_hash != definition_hash:
+            compiled = _CompiledParameters(definition_hash, [item.compile() for item in self.main_node.iter_items()])
+            self._compiled_parameters = compiled
+        return compiled
+
+    def compile_parser(self):
+        # A ToolParser for the tool as it is defined now, later add()/add_group() calls don't affect it.
+        item_elements = {}
+        parameter_node = self.main_node.xml_node(item_elements)
+        elements = {}
+        for item, element in item_elements.iteritems():
+            _set_xml_value(element, item.type, item.is_list, item.default)
+            elements[item.full_name] = (element, item.type, item.is_list)
+        input_file_params = frozenset(item.full_name for item in item_elements if 'input file' in item.tags)
+        compiled = self.get_compiled_parameters()
+        return ToolParser(self.name, self.version, compiled.definition_hash, compiled.entries,
+            self._tool_xml_node(parameter_node), elements, input_file_params, self.checksum_cache_dir)
+
+    def parameter_fingerprint(self, file_digests=False):
+        # A canonical digest of the resolved parameter values (the defaults before parse_args()), the same
+        # for the same configuration however it was given, see _parameter_fingerprint(). With file_digests,
+        # the contents of the files given to parameters tagged 'input file' count too (hashed through the
+        # checksum cache, see _ChecksumCache).
+        values = []
+        input_file_params = set()
+        for item in self.main_node.iter_items():
+            values.append((item.full_name, item.type, item.call_value if hasattr(item, 'call_value') else item.default))
+            if 'input file' in item.tags:
+                input_file_params.add(item.full_name)
+        return _parameter_fingerprint(self.name, self.version, values, input_file_params, file_digests,
+            self._checksum_cache() if file_digests else None)
+
+    def _run_cache_file(self, cache_dir, fingerprint):
+        return os.path.join(cache_dir, '%s-%s.ctd' % (self.name, fingerprint))
+
+    def find_previous_run(self, cache_dir, file_digests=False):
+        # The parameter CTD record_run() left in cache_dir for an earlier run of the tool with the same
+        # parameter fingerprint, or None. If there's one, the caller can skip recomputing its outputs.
+        cache_file = self._run_cache_file(cache_dir, self.parameter_fingerprint(file_digests))
+        return cache_file if os.path.isfile(cache_file) else None
+
+    def record_run(self, cache_dir, file_digests=False):
+        # Call after a successful run: stores its parameter CTD in cache_dir, named after the tool and its
+        # parameter fingerprint, for find_previous_run(). Returns its path.
+        fingerprint = self.parameter_fingerprint(file_digests)
+        cache_file = self._run_cache_file(cache_dir, fingerprint)
+        tool = self._tool_xml_node(self._parameter_xml_node(), fingerprint_digests=file_digests,
+            fingerprint=fingerprint)
+        try:
+            os.makedirs(cache_dir)
+        except OSError as e:  # already there, possibly made by a concurrent run
+            if e.errno != errno.EEXIST or not os.path.isdir(cache_dir):
+                raise
+        with _atomic_write(cache_file, 'w') as f:  # concurrent runs never see a partial record
+            f.write('<?xml version="1.0" ?>\n')
+            _write_pretty_xml(f, tool)
+        return cache_file
 
     def get_root(self):
         return self.main_node
 
-    def generate_ctd_tree(self, with_logging=False):
+    def get_parameter(self, path):
+        # O(1) lookup of a parameter's ArgumentItem, by its command line name (leading dash optional,
+        # like 'subparams:subsubsetting:param_3') or by a sequence of group names and parameter name
+        if not isinstance(path, basestring):
+            path = ':'.join(path)
+        return self.main_node.item_table[path.lstrip('-')]
+
+    def get_value(self, path):
+        # the resolved value of a parameter: what it was called with (after parse_args), or its default
+        item = self.get_parameter(path)
+        return item.call_value if hasattr(item, 'call_value') else item.default
+
+    def get_nested_namespace(self, parsed_args):
+        # nested view of the namespace returned by parse_args(), see NestedNamespace
+        return NestedNamespace(self.main_node, vars(parsed_args))
+
+    def validate_ctds(self, paths, processes=None):
+        # Checks many parameter CTDs against this tool's definition across a process pool. paths is a
+        # directory, a glob pattern or a list of those. Returns a ValidationReport per file, in order.
+        ctd_files = _expand_ctd_paths(paths)
+        entries = self.get_compiled_parameters().entries
+        if processes == 1 or len(ctd_files) < 2:
+            _init_validation_worker(entries)
+            return map(_validate_ctd_file, ctd_files)
+
+        import multiprocessing
+        processes = processes or multiprocessing.cpu_count()
+        pool = multiprocessing.Pool(processes, _init_validation_worker, (entries,))
+        try:
+            chunksize = max(1, len(ctd_files) / (4 * processes))
+            return pool.map(_validate_ctd_file, ctd_files, chunksize)
+        finally:
+            pool.close()
+            pool.join()
+
+    def check_input_files(self, threads=None, sniff=False):
+        # Checks that the files given to parameters with file_formats exist, are readable regular files and
+        # aren't empty, and with sniff that the first bytes of files in a format with a magic number (.gz,
+        # .bam...) fit their extension. Parameters tagged 'output file' are left alone. Every path is checked
+        # once, in a thread pool (16 threads by default, it's I/O latency that counts) and through a cache
+        # of os.stat() results that lasts for this call.
+        # Returns (parameter command line name, problem kind, message) tuples like ValidationReport.issues,
+        # one per parameter and kind of problem (see _FILE_PROBLEMS).
+        files = self._input_file_values()
+        paths = list(set(path for values in files.itervalues() for path in values))
+        stat_cache = _StatCache()
+        if threads == 1 or len(paths) < 2:
+            results = [_check_input_file(path, stat_cache, sniff) for path in paths]
+        else:
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(min(threads or 16, len(paths)))
+            try:
+                results = pool.map(lambda path: _check_input_file(path, stat_cache, sniff), paths)
+            finally:
+                pool.close()
+                pool.join()
+        problems = dict((path, kind) for path, kind in zip(paths, results) if kind is not None)
+
+        issues = []
+        for cl_name, values in files.iteritems():
+            offending = OrderedDict((kind, []) for kind in _FILE_PROBLEMS)
+            for path in values:
+                if path in problems:
+                    offending[problems[path]].append(path)
+            for kind, paths in offending.iteritems():
+                if paths:
+                    issues.append((cl_name, kind, 'Parameter %s: %d of %d input files %s. First ones: %s' % (
+                        cl_name[1:], len(paths), len(values), _FILE_PROBLEMS[kind],
+                        ', '.join(paths[:_REPORTED_VALUES]))))
+        return issues
+
+    def sweep_combinations(self, spec):
+        # Lazily enumerates the combinations of a sweep spec (see _sweep_parts()) as OrderedDicts of full
+        # parameter name: value. All values are cast and checked against the parameters' restrictions
+        # first (the grid's one by one, not its combinations), so invalid specs raise ValueError early.
+        return _sweep_combinations(spec, self.get_compiled_parameters())
+
+    def sweep(self, spec, out_dir, processes=None, extension='.ctd'):
+        # Writes a param CTD per combination of a sweep spec into out_dir, the parameters that aren't swept
+        # keeping their current values (from parse_args(), or the defaults), across a pool of processes
+        # (one per CPU by default). Combinations are enumerated and written in batches, so a sweep never
+        # has to fit into memory. With extension='.ctd.gz' etc. the CTDs are compressed (see _open_ctd()).
+        # out_dir also gets a manifest.tsv listing every file with its parameter fingerprint and swept
+        # values, written to a temp file first so only complete sweeps have one. Returns its path. Values of
+        # list parameters are JSON arrays there, as their values may contain spaces.
+        import json
+        import multiprocessing
+        from itertools import chain, islice
+        combinations = self.sweep_combinations(spec)
+        first = next(combinations, None)
+        if first is None:
+            raise ValueError('sweep: the spec has no combinations')
+        base_values = OrderedDict()
+        for item in self.main_node.iter_items():
+            value = item.call_value if hasattr(item, 'call_value') else item.default
+            if value is None and item.required and item.full_name not in first:
+                raise ValueError('sweep: required parameter %s is neither set nor swept' % item.full_name)
+            base_values[item.full_name] = value
+        swept = list(first)
+
+        if not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+        parser = self.compile_parser()
+        prefix = self.name + '_'
+        manifest_file = os.path.join(out_dir, 'manifest.tsv')
+        if not hasattr(os, 'fork'):
+            processes = 1  # the workers inherit the parser, see _init_sweep_worker()
+        processes = processes or multiprocessing.cpu_count()
+        pool = None
+        if processes > 1:
+            pool = multiprocessing.Pool(processes, _init_sweep_worker, (parser, base_values, out_dir, prefix,
+                extension))
+        else:
+            _init_sweep_worker(parser, base_values, out_dir, prefix, extension)
+        try:
+            with _atomic_write(manifest_file, 'w') as manifest:
+                manifest.write('\t'.join(['file', 'fingerprint'] + swept) + '\n')
+                indexed = enumerate(chain([first], combinations))
+                batch_size = 256 * processes
+                for batch in iter(lambda: list(islice(indexed, batch_size)), []):
+                    if pool is not None:
+                        results = pool.map(_write_sweep_ctd, batch, max(1, len(batch) / (4 * processes)))
+                    else:
+                        results = map(_write_sweep_ctd, batch)
+                    for (filename, fingerprint), (index, combination) in zip(results, batch):
+                        cells = [filename, fingerprint]
+                        for swept_value in combination.itervalues():
+                            cells.append(json.dumps(swept_value, separators=(',', ':'))
+                                if isinstance(swept_value, list) else _sweep_string(swept_value))
+                        manifest.write('\t'.join(cells) + '\n')
+        except BaseException:
+            if pool is not None:
+                pool.terminate()
+            raise
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        return manifest_file
+
+    def _input_file_values(self):
+        # {command line name: [paths]} of the parameters with file_formats that aren't tagged 'output file'
+        files = OrderedDict()
+        for item in self.main_node.iter_items():
+            if isinstance(item.restrictions, _FileFormat) and 'output file' not in item.tags:
+                value = item.call_value if hasattr(item, 'call_value') else item.default
+                if value is not None:
+                    files['-' + item.param_commandline_name()] = value if item.is_list else [value]
+        return files
+
+    def _checksum_cache(self):
+        if self.checksum_cache_dir is None:
+            return None
+        return _ChecksumCache(os.path.join(self.checksum_cache_dir, 'checksums'))
+
+    def start_input_checksums(self, threads=None):
+        # Starts computing the sha256 of the input files (see _input_file_values()) in a background pool
+        # of threads (4 by default), for finalize_log() to write into the log CTD. Digests are cached in
+        # checksum_cache_dir, so unchanged files are only ever hashed once, see _ChecksumCache.
+        self.input_checksums = _InputChecksums(self._input_file_values(), threads, self._checksum_cache())
+        return self.input_checksums
+
+    def generate_ctd_tree(self, with_logging=False, with_fingerprint=False):
+        # xml.etree syntax (no pretty print available, write_ctd() serializes it with _write_pretty_xml)
+        self.tool_xml_node = self._tool_xml_node(self._parameter_xml_node(), with_logging,
+            self.fingerprint_file_digests if with_fingerprint else None)
+
+    def _tool_xml_node(self, parameter_node, with_logging=False, fingerprint_digests=None, fingerprint=None):
+        # the CTD tree around a parameter tree made by ArgumentGroup.xml_node(), with the parameter
+        # fingerprint unless fingerprint_digests is None (else it's whether input file contents count).
+        # fingerprint is the one to use if it's already known.
+        from xml.etree.ElementTree import Element, SubElement
         tool_attribs = OrderedDict()
         tool_attribs['version'] = self.version
         tool_attribs['name'] = self.name
@@ -296,7 +2951,7 @@ class CTDopts(object):
         if with_logging:
             top_logs = SubElement(tool, 'logs')
             self.log_node = SubElement(top_logs, 'log') # TODO: this will be directly a son of tool! XXXXXXXXXXXXXXXXXXXXXX
-            self.log_node.attrib['executionTimeStart'] = datetime.datetime.now(pytz.utc).isoformat()
+            self.log_node.attrib['executionTimeStart'] = _utc_timestamp()
 
         # # LXML SYNTAX
         # # again so ugly, but lxml is strict w/ namespace attrib. generation, you can't just add them
@@ -329,24 +2984,58 @@ class CTDopts(object):
             tags='advanced'
             )
 
+        if fingerprint_digests is not None:
+            if fingerprint is None:
+                fingerprint = self.parameter_fingerprint(fingerprint_digests)
+            top_node.append(_fingerprint_node(fingerprint, fingerprint_digests))
+
         # all the above was boilerplate, now comes the actual parameter tree generation
-        args_top_node = self.main_node.xml_node()
-        top_node.append(args_top_node)
+        top_node.append(parameter_node)
 
         # # LXML w/ pretty print syntax
         # return tostring(tool, pretty_print=True, xml_declaration=True, encoding="UTF-8")
-
-        # xml.etree syntax (no pretty print available, so we use xml.dom.minidom stuff)
-        self.tool_xml_node = tool
+        return tool
+
+    def _parameter_xml_node(self):
+        # The XML of the parameter tree is built once per definition of the tool. After that, only the
+        # elements of items whose call_value changed get updated, so trees generated earlier change too.
+        # The cache is rebuilt when add()/add_group() change the definition.
+        digest = self.main_node.definition_digest.hexdigest()
+        dirty_items = self.main_node.dirty_items
+        if self._parameter_xml_cache is None or self._parameter_xml_cache[0] != digest:
+            dirty_items.clear()
+            item_elements = {}
+            self._parameter_xml_cache = (digest, self.main_node.xml_node(item_elements), item_elements)
+        else:
+            item_elements = self._parameter_xml_cache[2]
+            for item in dirty_items:
+                if item in item_elements:  # (not if it was replaced in the definition since)
+                    item.update_xml_node(item_elements[item])
+            dirty_items.clear()
+        return self._parameter_xml_cache[1]
 
     def finalize_log(self, stdout=None, stderr=None, exit_status=None):
+        # stdout and stderr can be strings, StringIO objects or _CaptureBuffers. The latter (used with
+        # --log_std_streams) are streamed into the CTD by write_ctd() without reading them into memory.
+        from xml.etree.ElementTree import SubElement
+        from StringIO import StringIO
 
         if hasattr(self, 'already_finalized'):  # see last lines of method why it's needed
             return
 
-        self.log_node.attrib['executionTimeStop'] = datetime.datetime.now(pytz.utc).isoformat()
+        if getattr(self, 'log_checkpointer', None) is not None:
+            self.log_checkpointer.stop()
+
+        self.log_node.attrib['executionTimeStop'] = _utc_timestamp()
         if exit_status is not None:
             self.log_node.attrib['executionStatus'] = str(exit_status)
+        for tee_stream in getattr(self, 'tee_streams', []):
+            tee_stream.flush()  # hand over whatever is still batched to the capture buffers
+        if getattr(self, 'fd_captures', None):
+            sys.stdout.flush()
+            sys.stderr.flush()
+            for fd_capture in self.fd_captures:
+                fd_capture.stop()
 
         if stdout is None:
             stdout = self.stdout_stream if hasattr(self, 'stdout_stream') else ''
@@ -367,6 +3056,9 @@ class CTDopts(object):
 
         SubElement(self.log_node, 'executionErrors').text = stderr_data
         SubElement(self.log_node, 'executionMessage').text = stdout_data
+        execution = self._execution_node()
+        if execution is not None:
+            self.tool_xml_node.find('PARAMETERS/NODE').append(execution)
 
         self.write_ctd()
         print "Parameter and log container %s written to current directory successfully." % self.out_ctd_file
@@ -376,41 +3068,104 @@ class CTDopts(object):
         # manually.
         self.already_finalized = True
 
+    def _execution_node(self, input_checksums=True):
+        # the record of the run for the log CTD (see _record_node()), or None if there's nothing to record:
+        # with log_resources phase timings and resource usage, with input_checksums those of the input files
+        # if start_input_checksums() was called (waiting for them)
+        execution = _record_node(None, 'execution', 'Record of the run this log is of, not parameters of the tool')
+        if self.log_resources:
+            execution.append(self.phase_timer.xml_node())
+            execution.append(_resource_usage_node())
+        if input_checksums and getattr(self, 'input_checksums', None) is not None:
+            execution.append(self.input_checksums.xml_node())
+        return execution if len(execution) else None
+
     def write_ctd(self):
         if not hasattr(self, 'tool_xml_node'):
             self.generate_ctd_tree()
-        with open(self.out_ctd_file, 'w') as f:
-            xml_content = parseString(tostring(self.tool_xml_node, encoding="UTF-8")).toprettyxml()
-            f.write(xml_content)
-
-    def _register_parameter(self, element, base_name, is_root=False):
-        colon = '' if is_root else ':'
-        full_name = '%s%s%s' % (base_name, colon, element.attrib['name'])
-        if element.tag == 'ITEM':
-            if element.attrib['type'] == 'boolean':  # for booleans, only register them if they are 'true'
-                if element.attrib['value'] == 'true':
-                    self.ini_params[full_name] = [True]
-            else:  # for non-booleans just take whatever we find in the 'value' attrib
-                self.ini_params[full_name] = [element.attrib['value']]
-        elif element.tag == 'ITEMLIST':
-            self.ini_params[full_name] = [listitem.attrib['value'] for listitem in element]
-        elif element.tag == 'NODE':
-            for child in element:
-                self._register_parameter(child, full_name, is_root=False)
+        with self.phase('write_ctd'):
+            # replaces the file (or the last log checkpoint) only once it's complete
+            with _atomic_write(self.out_ctd_file, ctd=True) as f:
+                f.write('<?xml version="1.0" ?>\n')
+                _write_pretty_xml(f, self.tool_xml_node)
+            if getattr(self, 'schema_check', False):  # --validate_schema
+                self._warn_schema_problems(self.out_ctd_file, _schema_validator().validate_element(self.tool_xml_node))
+            if getattr(self, 'param_sidecar', False):  # --write_param_sidecar
+                self.write_param_sidecar()
+
+    def validate_schema(self, ctd_file=None):
+        # Problems of a CTD/INI file, or without one of the CTD this object would write, with respect to the
+        # bundled CTD_0_3 and Param_1_6_2 schemas. An empty list if it's valid.
+        if ctd_file is not None:
+            return _schema_validator().validate(ctd_file)
+        if not hasattr(self, 'tool_xml_node'):
+            self.generate_ctd_tree()
+        return _schema_validator().validate_element(self.tool_xml_node)
+
+    def _warn_schema_problems(self, ctd_file, problems):
+        if problems:
+            warnings.warn('%s does not conform to the CTD schema:\n  %s' % (ctd_file, '\n  '.join(problems)))
+
+    def write_param_sidecar(self, ctd_file=None):
+        # Writes a binary sidecar next to a CTD written by write_ctd(), holding the parameter values
+        # --input_ctd reads from it already cast, numeric lists packed into arrays. With --read_param_sidecar,
+        # --input_ctd loads the sidecar instead of the XML while the hashes of the CTD file and of the tool
+        # definition in it match.
+        import json
+        from array import array
+        ctd_file = ctd_file or self.out_ctd_file
+        sidecar_file = _param_sidecar_file(ctd_file)
+
+        parameters = []  # (command line name, None, values) or (command line name, typecode, length)
+        arrays = []
+        for item in self.main_node.iter_items():
+            cl_name = '-' + item.param_commandline_name()
+            value = item.call_value if hasattr(item, 'call_value') else item.default
+            if item.type == bool:
+                if value:
+                    parameters.append((cl_name, None, [True]))
+                continue
+            if isinstance(value, ManifestList):
+                parameters.append((cl_name, None, [value.reference()]))  # reading it makes a ManifestList again
+                continue
+            # cast from the strings that are in the XML (see xml_node()), str() drops digits of floats
+            # and reading the sidecar has to give the same values as reading the XML
+            strings = ['' if value is None else str(value)] if not item.is_list else map(str, value or [])
+            if not strings:
+                continue  # unset lists aren't bound
+            try:
+                typed = _cast_list(item.type, strings)
+            except ValueError:
+                # reading the XML will report the invalid value, there mustn't be a stale sidecar either
+                if os.path.exists(sidecar_file):
+                    os.remove(sidecar_file)
+                return
+            if item.is_list and item.type in (int, float):
+                try:
+                    packed = array('l' if item.type == int else 'd', typed)
+                    parameters.append((cl_name, packed.typecode, len(packed)))
+                    arrays.append(packed)
+                    continue
+                except OverflowError:  # ints too big for a C long stay a list
+                    pass
+            parameters.append((cl_name, None, typed))
+
+        try:
+            header = json.dumps(_sidecar_header(self.definition_hash(), ctd_file, parameters), separators=(',', ':'))
+        except ValueError:  # strings that aren't UTF-8: reading the XML will have to do
+            if os.path.exists(sidecar_file):
+                os.remove(sidecar_file)
+            return
+        with _atomic_write(sidecar_file) as f:
+            f.write(header + '\n')  # (json escapes newlines in strings, so the header is a single line)
+            for packed in arrays:
+                packed.tofile(f)
 
     def read_ini(self, ini_file):
-        ini = parse(ini_file)
-        root = ini.getroot()
-
-        # for INI compatibility (which is an xml with the <PARAMETERS> node torn out of a CTD)
-        # we check whether <PARAMETERS> is the root of the xml or a child of <tool>
-        param_root = root if root.tag == 'PARAMETERS' else root.find('PARAMETERS')
-        parameters = param_root.find('NODE').find('NODE')
-
         self.ini_params = OrderedDict()
-
-        for child in parameters:
-            self._register_parameter(child, '-', is_root=True)
+        with self.phase('read_ini'):
+            for full_name, values in _iter_ini_parameters(ini_file):
+                self.ini_params[full_name] = values
 
         # as range/file format/vocabulary checkers are already embedded in the argparse parser object
         # we can just generate the equivalent command line call quick&dirty and let argparse handle it.
@@ -431,6 +3186,7 @@ class CTDopts(object):
         return command_line
 
     def parse_args(self, *args):
+        import argparse
 
         # although argparse supports mutually exclusive arguments, it doesn't support argument groups
         # in mutexes. What we want is a mutually exclusive -write_tool_ctd vs -input_ctd vs full-fledged
@@ -443,10 +3199,41 @@ class CTDopts(object):
         preparser.add_argument('--write_tool_ctd', nargs='*')
         preparser.add_argument('--input_ctd', type=str)  # aka as INI files from earlier
         preparser.add_argument('--write_param_ctd', type=str)
+        preparser.add_argument('--write_param_sidecar', action='store_true')
+        preparser.add_argument('--read_param_sidecar', action='store_true')
+        preparser.add_argument('--fingerprint_input_files', action='store_true')
+        preparser.add_argument('--check_input_files', action='store_true')
+        preparser.add_argument('--sniff_input_files', action='store_true')
+        preparser.add_argument('--sweep', type=str)
+        preparser.add_argument('--sweep_dir', type=str)
+        preparser.add_argument('--sweep_processes', type=int)
         preparser.add_argument('--log_output', action='store_true')
         preparser.add_argument('--log_std_streams', action='store_true')
+        preparser.add_argument('--log_capture_fds', action='store_true')
+        preparser.add_argument('--log_checkpoint_interval', type=float)
+        preparser.add_argument('--log_input_checksums', action='store_true')
+        preparser.add_argument('--log_resources', action='store_true')
+        preparser.add_argument('--log_max_bytes', type=int)
+        preparser.add_argument('--log_truncate', choices=['head', 'tail', 'head_tail'], default='head_tail')
+        preparser.add_argument('--log_memory_limit', type=int, default=8 * 1024 * 1024)
+        preparser.add_argument('--validate_ctds', nargs='+')
+        preparser.add_argument('--validate_schema', action='store_true')
+        preparser.add_argument('--validate_processes', type=int)
         directives, rest = preparser.parse_known_args(*args)
 
+        # if -validate_ctds is provided, check the given parameter CTDs against the tool, report and exit
+        if directives.validate_ctds is not None:
+            reports = self.validate_ctds(directives.validate_ctds, directives.validate_processes)
+            for report in reports:
+                print report
+            n_invalid = sum(1 for report in reports if not report.valid)
+            print "%d of %d parameter CTDs valid." % (len(reports) - n_invalid, len(reports))
+            sys.exit(1 if n_invalid else 0)
+
+        self.schema_check = directives.validate_schema  # of the input CTD, and of CTDs we write
+        self.fingerprint_file_digests = directives.fingerprint_input_files  # in param CTDs' fingerprints
+        self.log_resources = directives.log_resources
+
         # if -write_tool_ctd is provided, write tool-describing CTD and exit
         if directives.write_tool_ctd is not None:
             # check whether a filename was provided or not. If not, use filename generated from tool name
@@ -455,39 +3242,139 @@ class CTDopts(object):
             print "Tool-describing %s written to current directory successfully. Exiting." % self.out_ctd_file
             sys.exit()
         else:
-            # if -input_ctd was called, we create the argument list from the ini file and then we append
-            # whatever else command line arguments we had (they will overwrite those in the ini)
-            final_args = self.read_ini(directives.input_ctd) if directives.input_ctd is not None else []
-            final_args.extend(rest)
-
-            regular_parser = argparse.ArgumentParser()
-            # we populate an argparse parser with the attributes defined in the CTDopts object...
-            self.main_node.append_argument(regular_parser)
-
-            # ...and parse our INI/commandline arguments
-            parsed_args = regular_parser.parse_args(final_args)
+            # if -input_ctd was called, we bind its values straight to the parameters instead of turning
+            # them back into a command line for argparse: with huge lists argparse's option matching
+            # would be the bottleneck. argparse only parses the actual command line, and parameters
+            # bound from the CTD are made optional with no default in it, so whatever it didn't
+            # see comes from the CTD. Order of resolution: command line > input CTD > default.
+            bound_params = OrderedDict()
+            if directives.input_ctd is not None:
+                # Required list parameters that are not set in a CTD but ARE set in command line must
+                # not count as bound, empty lists would be invalid for nargs='+' anyway.
+                # the binary sidecar of the CTD (see --write_param_sidecar) has the same values, already cast.
+                # It's only looked for with --read_param_sidecar.
+                if directives.validate_schema:
+                    self._warn_schema_problems(directives.input_ctd, self.validate_schema(directives.input_ctd))
+                with self.phase('read_ini'):
+                    sidecar_params = None
+                    if directives.read_param_sidecar:
+                        sidecar_params = _load_param_sidecar(directives.input_ctd, self.definition_hash())
+                    if sidecar_params is not None:
+                        bound_params = sidecar_params
+                    else:
+                        bound_params.update((name, values) for name, values in
+                            _iter_ini_parameters(directives.input_ctd) if len(values))
+                self.ini_params = bound_params
+
+            # with --sweep, the spec is read up front: swept parameters are bound by it like by an input
+            # CTD, so they aren't required on the command line
+            sweep_spec, swept = None, set()
+            if directives.sweep is not None:
+                import json
+                try:
+                    with open(directives.sweep) as f:
+                        sweep_spec = json.load(f)
+                    swept = set('-' + name for name in _sweep_kinds(sweep_spec)[-1])
+                except (IOError, ValueError) as e:
+                    sys.stderr.write('%s: error: %s\n' % (os.path.basename(sys.argv[0]), e))
+                    sys.exit(2)
+
+            # the plain cases are handled from the compiled parameter tree without ever building an
+            # argparse parser. It returns None for anything it can't handle.
+            with self.phase('parse_args'):
+                parsed_args = self.get_compiled_parameters().parse_args(rest, bound_params)
+
+                if parsed_args is None:
+                    regular_parser = argparse.ArgumentParser()
+                    # we populate an argparse parser with the attributes defined in the CTDopts object...
+                    self.main_node.append_argument(regular_parser, set(bound_params) | swept)
+
+                    # ...and parse our commandline arguments...
+                    parsed_args = regular_parser.parse_args(rest)
+
+                    # ...cast list parameters from the command line in bulk (argparse left them as strings)...
+                    items = dict(('-' + name, item) for name, item in self.main_node.item_table.iteritems())
+                    for item in self.main_node.iter_items():
+                        value = getattr(parsed_args, item.argparse_dest(), None)
+                        if item.is_list and value is not None and value is not item.default:
+                            try:
+                                setattr(parsed_args, item.argparse_dest(), item.cast_value(value))
+                            except ValueError as e:
+                                regular_parser.error(str(e))
+
+                    # ...then fill in what the command line didn't override from the input CTD.
+                    unknown = [name for name in bound_params if name not in items]
+                    if unknown:
+                        regular_parser.error('unrecognized arguments: %s' % ' '.join(unknown))
+                    for cl_name, values in bound_params.iteritems():
+                        item = items[cl_name]
+                        if not hasattr(parsed_args, item.argparse_dest()):
+                            try:
+                                setattr(parsed_args, item.argparse_dest(), item.cast_value(values))
+                            except ValueError as e:
+                                regular_parser.error(str(e))
 
             # we store all parameter values we were given in case the user wants to output it in an out-CTD
             # so starting from main_node, we traverse the tree and store actual values in elements
 
-            self.main_node.store_call_value(vars(parsed_args))
+            with self.phase('store_call_value'):
+                self.main_node.store_call_value(vars(parsed_args))
+
+            # fail now rather than hours into the job if input files are missing, empty or unreadable
+            if directives.check_input_files or directives.sniff_input_files:
+                with self.phase('check_input_files'):
+                    issues = self.check_input_files(sniff=directives.sniff_input_files)
+                if issues:
+                    sys.stderr.write('%s: error: input files failed checks:\n  %s\n' % (
+                        os.path.basename(sys.argv[0]), '\n  '.join(message for name, kind, message in issues)))
+                    sys.exit(2)
+
+            # if -sweep is provided, write a param CTD per combination of the spec's values and exit
+            if sweep_spec is not None:
+                try:
+                    manifest_file = self.sweep(sweep_spec, directives.sweep_dir or self.name + '_sweep',
+                        directives.sweep_processes)
+                except (IOError, ValueError) as e:
+                    sys.stderr.write('%s: error: %s\n' % (os.path.basename(sys.argv[0]), e))
+                    sys.exit(2)
+                print "Sweep written, see %s. Exiting." % manifest_file
+                sys.exit()
 
             if directives.write_param_ctd:
                 self.out_ctd_file = directives.write_param_ctd
+                self.param_sidecar = directives.write_param_sidecar
                 if directives.log_output:
-                    self.generate_ctd_tree(with_logging=True)
+                    self.generate_ctd_tree(with_logging=True, with_fingerprint=True)
                     if directives.log_std_streams:
-                        self.stdout_stream = StringIO()
-                        self.stderr_stream = StringIO()
-                        sys.stdout = _MultiStream(sys.stdout, self.stdout_stream)
-                        sys.stderr = _MultiStream(sys.stderr, self.stderr_stream)
+                        import atexit
+                        self.stdout_stream = _CaptureBuffer(directives.log_max_bytes, directives.log_truncate,
+                            directives.log_memory_limit)
+                        self.stderr_stream = _CaptureBuffer(directives.log_max_bytes, directives.log_truncate,
+                            directives.log_memory_limit)
+                        if directives.log_capture_fds:
+                            # capture at file descriptor level, which sees child processes too. Python's
+                            # own writes end up in the pipes as well, so no tee streams are needed.
+                            sys.stdout.flush()
+                            sys.stderr.flush()
+                            self.fd_captures = [_FdCapture(1, self.stdout_stream), _FdCapture(2, self.stderr_stream)]
+                            for fd_capture in self.fd_captures:
+                                fd_capture.start()
+                        else:
+                            sys.stdout = _TeeStream(sys.stdout, self.stdout_stream)
+                            sys.stderr = _TeeStream(sys.stderr, self.stderr_stream)
+                            self.tee_streams = [sys.stdout, sys.stderr]
                         atexit.register(self.finalize_log)
                     else:
                         # if -log_std_streams is unset, it's down to the user to log whatever he/she
                         # wants and pass it to finalize_log(stdout, stderr, exit_status) later
                         pass
+                    if directives.log_checkpoint_interval:
+                        self.log_checkpointer = _LogCheckpointer(self, directives.log_checkpoint_interval)
+                        self.log_checkpointer.start()
+                    if directives.log_input_checksums:
+                        self.start_input_checksums()
                 else:
-                    self.generate_ctd_tree(with_logging=False)
+                    self.generate_ctd_tree(with_logging=False, with_fingerprint=True)
                     self.write_ctd()
                     print "Parameter container %s written to current directory successfully." % self.out_ctd_file
 
@@ -0,0 +1,577 @@
+import os
+import re
+import sys
+import json
+import time
+import tempfile
+import resource
+import subprocess
+from collections import OrderedDict
+from xml.etree.ElementTree import tostring, parse
+from xml.dom.minidom import parseString
+
+from CTDopts import CTDopts, _TeeStream, _CaptureBuffer, _FdCapture
+
+# Rough timing of CTDopts' CTD writer and reader on parameter trees holding large ITEMLISTs.
+# Usage: python benchmark.py [list_size ...]
+#
+# Cold start check: median import and parse_args() time of a small tool in fresh interpreters. Exits with
+# an error if a budget is exceeded or if modules meant to be imported lazily got imported with CTDopts.
+# Usage: python benchmark.py startup [import_budget_ms parse_budget_ms]
+#
+# Writes per second through the --log_std_streams tee, compared to the raw stream and the old _MultiStream.
+# Usage: python benchmark.py tee [n_writes]
+#
+# Throughput of file descriptor level capture (--log_capture_fds) with a child process flooding stdout.
+# Usage: python benchmark.py fdcapture [megabytes]
+#
+# Generating many param CTD trees from one definition with a few values changed in between, with the cached
+# parameter XML and with it rebuilt every time.
+# Usage: python benchmark.py emit [n_params n_ctds]
+#
+# Suite over synthetic tools of every shape and size: wall time and peak memory of each CTDopts hot path,
+# every case in a fresh interpreter, written to a JSON file. compare flags what got slower or bigger
+# between two such files and exits with an error if anything did.
+# Usage: python benchmark.py suite [-o results.json] [--quick] [--filter regex] [--repeat n]
+#        python benchmark.py compare old.json new.json [--time-tolerance 0.2] [--memory-tolerance 0.2]
+
+
+def build_opts(list_size):
+    opts = CTDopts(name='benchTool', version='0.0.1', description='Synthetic benchmark tool')
+    root = opts.get_root()
+    root.add('input_files', is_list=True, type=str, file_formats=['fastq', 'fastq.gz'],
+        default=['sample_%07d.fastq.gz' % i for i in xrange(list_size)],
+        description='A large list of input files')
+    group = root.add_group('settings', 'Numeric settings')
+    group.add('thresholds', is_list=True, type=float, num_range=(0, None),
+        default=[i * 0.5 for i in xrange(list_size)], description='A large list of floats')
+    return opts
+
+
+def build_wide_opts(n_params):
+    # many small parameters spread over nested groups, like tools with thousands of settings
+    opts = CTDopts(name='wideTool', version='0.0.1')
+    group = opts.get_root()
+    for i in xrange(n_params):
+        if i % 50 == 0:
+            group = opts.get_root().add_group('group_%d' % (i / 50), 'Group of settings')
+        group.add('param_%d' % i, type=int, num_range=(0, None), default=i, description='Setting %d' % i)
+    return opts
+
+
+def build_flat_opts(n_params):
+    # n_params parameters straight in the root group
+    opts = CTDopts(name='flatTool', version='0.0.1')
+    root = opts.get_root()
+    for i in xrange(n_params):
+        root.add('param_%d' % i, type=int, num_range=(0, None), default=i, description='Setting %d' % i)
+    return opts
+
+
+def build_deep_opts(n_params, depth):
+    # n_params parameters spread evenly over a chain of `depth` nested groups
+    opts = CTDopts(name='deepTool', version='0.0.1')
+    groups = [opts.get_root()]
+    for level in xrange(depth):
+        groups.append(groups[-1].add_group('level_%d' % level, 'Nesting level %d' % level))
+    for i in xrange(n_params):
+        groups[i % len(groups)].add('param_%d' % i, type=float, default=i * 0.5, description='Setting %d' % i)
+    return opts
+
+
+class LegacyMultiStream(object):
+    # the closure-dispatching tee CTDopts used for --log_std_streams before _TeeStream
+    def __init__(self, stream1, stream2):
+        self._stream1 = stream1
+        self._stream2 = stream2
+
+    def __getattr__(self, attr, *args, **kwargs):
+        return self._wrap(attr, *args, **kwargs)
+
+    def _wrap(self, attr, *args, **kwargs):
+        def g(*a, **kw):
+            if hasattr(self._stream2, attr):
+                getattr(self._stream2, attr, *args, **kwargs)(*a, **kw)
+            return getattr(self._stream1, attr, *args, **kwargs)(*a, **kw)
+        return g
+
+    def __setattr__(self, name, value):
+        if name in ('_stream1', '_stream2'):
+            self.__dict__[name] = value
+        else:
+            return setattr(self._stream1, name, value)
+
+
+def legacy_write_ctd(opts):
+    # the tostring -> minidom -> toprettyxml round trip CTDopts.write_ctd used to do
+    with open(opts.out_ctd_file, 'w') as f:
+        f.write(parseString(tostring(opts.tool_xml_node, encoding="UTF-8")).toprettyxml())
+
+
+def legacy_read_ini(ini_file):
+    # what CTDopts.read_ini used to do before streaming: build the full DOM, then walk the parameters
+    root = parse(ini_file).getroot()
+    param_root = root if root.tag == 'PARAMETERS' else root.find('PARAMETERS')
+    parameters = param_root.find('NODE').find('NODE')
+    values = []
+    for element in parameters.iter():
+        if element.tag == 'ITEM':
+            values.append(element.attrib['value'])
+        elif element.tag == 'LISTITEM':
+            values.append(element.attrib['value'])
+    return values
+
+
+def legacy_parse_input_ctd(opts, ini_file):
+    # the old --input_ctd path: turn the CTD into a command line and let argparse re-parse all of it
+    import argparse
+    parser = argparse.ArgumentParser()
+    opts.main_node.append_argument(parser)
+    return parser.parse_args(opts.read_ini(ini_file))
+
+
+def timed(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+
+PEAK_RSS_SCRIPT = """
+import benchmark
+before = benchmark.peak_rss()
+benchmark.%s(*%r)
+print benchmark.peak_rss() - before
+"""
+
+
+def peak_rss():
+    # peak resident set size in kB. ru_maxrss survives fork and exec, so in a process started by a big
+    # parent it would report the parent's peak. Linux' VmHWM is reset on exec, use it where available.
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def peak_rss_growth(func, *args):
+    # Runs benchmark.func(*args) in a fresh interpreter and returns how much (in MB) its peak RSS grew
+    # during the call.
+    here = os.path.dirname(os.path.abspath(__file__))
+    output = subprocess.check_output([sys.executable, '-c', PEAK_RSS_SCRIPT % (func.__name__, args)], cwd=here)
+    return int(output.split()[-1]) / 1024.0
+
+
+def streaming_read_ini(ini_file):
+    return CTDopts('reader', '0').read_ini(ini_file)
+
+
+def bench_write_ctd(list_size):
+    opts = build_opts(list_size)
+    opts.generate_ctd_tree()
+
+    handle, legacy_file = tempfile.mkstemp(suffix='.ctd')
+    os.close(handle)
+    handle, new_file = tempfile.mkstemp(suffix='.ctd')
+    os.close(handle)
+    try:
+        opts.out_ctd_file = legacy_file
+        legacy_time = timed(legacy_write_ctd, opts)
+        opts.out_ctd_file = new_file
+        new_time = timed(opts.write_ctd)
+        with open(legacy_file) as f1, open(new_file) as f2:
+            identical = f1.read() == f2.read()
+    finally:
+        os.remove(legacy_file)
+        os.remove(new_file)
+
+    print '%10d items  legacy: %8.3fs  streaming: %8.3fs  speedup: %5.1fx  identical output: %s' % (
+        list_size, legacy_time, new_time, legacy_time / max(new_time, 1e-9), identical)
+
+
+def bench_read_ini(list_size):
+    opts = build_opts(list_size)
+    opts.generate_ctd_tree(with_logging=True)
+
+    handle, ctd_file = tempfile.mkstemp(suffix='.ctd')
+    os.close(handle)
+    opts.out_ctd_file = ctd_file
+    try:
+        # a log of an earlier run about as large as the parameter lists
+        opts.finalize_log(stdout='log line\n' * list_size, stderr='', exit_status=0)
+        legacy_time = timed(legacy_read_ini, ctd_file)
+        new_time = timed(streaming_read_ini, ctd_file)
+        legacy_mem = peak_rss_growth(legacy_read_ini, ctd_file)
+        new_mem = peak_rss_growth(streaming_read_ini, ctd_file)
+    finally:
+        os.remove(ctd_file)
+
+    print '%10d items  legacy: %8.3fs %8.1fMB  streaming: %8.3fs %8.1fMB' % (
+        list_size, legacy_time, legacy_mem, new_time, new_mem)
+
+
+def bench_parse_args(list_size):
+    opts = build_opts(list_size)
+    handle, ctd_file = tempfile.mkstemp(suffix='.ctd')
+    os.close(handle)
+    opts.out_ctd_file = ctd_file
+    try:
+        opts.write_ctd()
+        legacy_time = timed(legacy_parse_input_ctd, build_opts(list_size), ctd_file)
+        new_time = timed(build_opts(list_size).parse_args, ['--input_ctd', ctd_file])
+    finally:
+        os.remove(ctd_file)
+
+    print '%10d items  legacy: %8.3fs  direct binding: %8.3fs  speedup: %5.1fx' % (
+        list_size, legacy_time, new_time, legacy_time / max(new_time, 1e-9))
+
+
+def bench_definition(n_params, depth=20):
+    start = time.time()
+    opts = build_deep_opts(n_params, depth)
+    define_time = time.time() - start
+    start = time.time()
+    for item in opts.get_root().iter_items():
+        item.param_commandline_name()
+    opts.get_root().store_call_value({})
+    walk_time = time.time() - start
+    memory = peak_rss_growth(build_deep_opts, n_params, depth)
+
+    print '%10d params define: %8.3fs  name lookups + store_call_value: %8.3fs  memory: %8.1fMB' % (
+        n_params, define_time, walk_time, memory)
+
+
+def bench_fast_parse(n_params):
+    arg_strings = ['-group_0:param_1', '7']
+    argparse_opts = build_wide_opts(n_params)
+    argparse_opts.get_compiled_parameters().parse_args = lambda *args: None  # always take the argparse route
+    argparse_time = timed(argparse_opts.parse_args, arg_strings)
+    fast_time = timed(build_wide_opts(n_params).parse_args, arg_strings)
+
+    print '%10d params argparse: %8.3fs  compiled parameters: %8.3fs  speedup: %5.1fx' % (
+        n_params, argparse_time, fast_time, argparse_time / max(fast_time, 1e-9))
+
+
+def bench_emit(n_params, n_ctds):
+    opts = build_wide_opts(n_params)
+    items = list(opts.get_root().iter_items())
+    timings = []
+    for rebuild in (True, False):
+        start = time.time()
+        for i in xrange(n_ctds):
+            for item in items[i % 10::n_params / 3]:
+                item.call_value = i
+            if rebuild:
+                opts._parameter_xml_cache = None
+            opts.generate_ctd_tree()
+        timings.append((time.time() - start) / n_ctds)
+    print '%10d params, %d trees  rebuilt: %8.2fms  cached: %8.2fms per tree  speedup: %5.1fx' % (n_params, n_ctds,
+        timings[0] * 1000, timings[1] * 1000, timings[0] / max(timings[1], 1e-9))
+
+
+def bench_tee(n_writes):
+    line = 'processed record 12345 of 67890, everything is fine\n'
+    with open(os.devnull, 'w') as devnull:
+        streams = [
+            ('raw stream', devnull),
+            ('_MultiStream (old)', LegacyMultiStream(devnull, _CaptureBuffer())),
+            ('_TeeStream', _TeeStream(devnull, _CaptureBuffer())),
+        ]
+        for label, stream in streams:
+            start = time.time()
+            for _ in xrange(n_writes):
+                stream.write(line)
+            stream.flush()
+            elapsed = time.time() - start
+            print '%-20s %12.0f writes/s' % (label, n_writes / max(elapsed, 1e-9))
+
+        # several threads printing at the same time must not lose anything
+        import threading
+        capture = _CaptureBuffer()
+        tee = _TeeStream(devnull, capture)
+        threads = [threading.Thread(target=lambda: [tee.write(line) for _ in xrange(n_writes / 8)])
+            for _ in xrange(8)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        tee.flush()
+        elapsed = time.time() - start
+        print '%-20s %12.0f writes/s  all captured: %s' % ('_TeeStream, 8 threads', 8 * (n_writes / 8) /
+            max(elapsed, 1e-9), capture.total_size == 8 * (n_writes / 8) * len(line))
+
+
+def bench_fd_capture(megabytes):
+    child = [sys.executable, '-c', 'import sys\nfor _ in xrange(%d): sys.stdout.write("x" * 1023 + "\\n")' %
+        (megabytes * 1024)]
+    with open(os.devnull, 'w') as devnull:
+        start = time.time()
+        subprocess.check_call(child, stdout=devnull)
+        direct_time = time.time() - start
+
+    capture = _CaptureBuffer(max_bytes=1024 * 1024)
+    fd_capture = _FdCapture(1, capture, echo=False)
+    sys.stdout.flush()
+    fd_capture.start()
+    start = time.time()
+    subprocess.check_call(child)
+    fd_capture.stop()
+    captured_time = time.time() - start
+
+    print 'child writing %dMB  to /dev/null: %7.1fMB/s  captured: %7.1fMB/s  all captured: %s' % (megabytes,
+        megabytes / max(direct_time, 1e-9), megabytes / max(captured_time, 1e-9),
+        capture.total_size == megabytes * 1024 * 1024)
+
+
+# shape: (builder taking the size, sizes, sizes with --quick). deep is 1000 parameters over `size` levels,
+# log is `size` MB of captured stdout written by finalize_log().
+SUITE_SHAPES = OrderedDict([
+    ('flat', (build_flat_opts, [10, 100, 1000, 10000, 100000], [10, 1000])),
+    ('deep', (lambda depth: build_deep_opts(1000, depth), [1, 5, 10, 20], [1, 20])),
+    ('list', (build_opts, [10, 1000, 100000, 1000000], [10, 10000])),
+    ('log', (None, [1, 16, 128], [1])),
+])
+SUITE_OPERATIONS = ['generate_ctd_tree', 'write_ctd', 'read_ini', 'parse_args', 'parse_args_input_ctd']
+
+SUITE_SCRIPT = """
+import json, time, benchmark
+run = benchmark.suite_setup(*%r)
+before = benchmark.peak_rss()
+start = time.time()
+run()
+elapsed = time.time() - start
+print json.dumps([elapsed, (benchmark.peak_rss() - before) / 1024.0, benchmark.peak_rss() / 1024.0])
+"""
+
+
+def suite_command_line(opts):
+    # the first ten parameters set to their defaults, lists with all of their values
+    command_line = []
+    for item in list(opts.get_root().iter_items())[:10]:
+        command_line.append('-' + item.param_commandline_name())
+        command_line.extend(map(str, item.default) if item.is_list else [str(item.default)])
+    return command_line
+
+
+def suite_input_ctd(shape, size, work_dir):
+    return os.path.join(work_dir, '%s_%d.ctd' % (shape, size))
+
+
+def suite_setup(operation, shape, size, work_dir):
+    # builds what `operation` needs and returns the call to measure
+    out_file = os.path.join(work_dir, 'out_%d.ctd' % os.getpid())
+    if shape == 'log':
+        opts = build_flat_opts(100)
+        opts.out_ctd_file = out_file
+        opts.generate_ctd_tree(with_logging=True)
+        opts.stdout_stream = _CaptureBuffer()
+        line = 'processed record 12345 of 67890, everything is fine\n'
+        for _ in xrange(size * 1024 * 1024 / len(line)):
+            opts.stdout_stream.write(line)
+        return lambda: opts.finalize_log(exit_status=0)
+
+    opts = SUITE_SHAPES[shape][0](size)
+    if operation == 'generate_ctd_tree':
+        return opts.generate_ctd_tree
+    if operation == 'write_ctd':
+        opts.generate_ctd_tree()
+        opts.out_ctd_file = out_file
+        return opts.write_ctd
+    if operation == 'read_ini':
+        return lambda: opts.read_ini(suite_input_ctd(shape, size, work_dir))
+    if operation == 'parse_args':
+        command_line = suite_command_line(opts)
+        return lambda: opts.parse_args(command_line)
+    if operation == 'parse_args_input_ctd':
+        return lambda: opts.parse_args(['--input_ctd', suite_input_ctd(shape, size, work_dir)])
+    raise ValueError('Unknown operation %s' % operation)
+
+
+def suite_cases(quick=False, name_filter=None):
+    for shape, (_, sizes, quick_sizes) in SUITE_SHAPES.iteritems():
+        for size in (quick_sizes if quick else sizes):
+            for operation in (['finalize_log'] if shape == 'log' else SUITE_OPERATIONS):
+                name = '%s/%s/%d' % (operation, shape, size)
+                if name_filter is None or re.search(name_filter, name):
+                    yield name, operation, shape, size
+
+
+def run_suite(results_file, quick=False, name_filter=None, repeat=1):
+    # Every case runs `repeat` times, each in a fresh interpreter, and keeps the fastest time, the smallest
+    # growth of peak memory during the measured call (0 if building its input took more) and the smallest
+    # peak memory of the whole process, in MB.
+    import shutil
+    import platform
+    here = os.path.dirname(os.path.abspath(__file__))
+    cases = list(suite_cases(quick, name_filter))
+    work_dir = tempfile.mkdtemp()
+    results = []
+    try:
+        # the input CTDs for read_ini and --input_ctd are written once, by this process
+        for shape, size in sorted(set((shape, size) for _, operation, shape, size in cases
+                if operation in ('read_ini', 'parse_args_input_ctd'))):
+            opts = SUITE_SHAPES[shape][0](size)
+            opts.generate_ctd_tree()
+            opts.out_ctd_file = suite_input_ctd(shape, size, work_dir)
+            opts.write_ctd()
+        del opts
+
+        for name, operation, shape, size in cases:
+            runs = []
+            for _ in xrange(repeat):
+                output = subprocess.check_output([sys.executable, '-c',
+                    SUITE_SCRIPT % ((operation, shape, size, work_dir),)], cwd=here)
+                runs.append(json.loads(output.splitlines()[-1]))
+            seconds, growth, peak = [min(values) for values in zip(*runs)]
+            print '%-40s %10.4fs %10.1fMB growth %10.1fMB peak' % (name, seconds, growth, peak)
+            sys.stdout.flush()
+            results.append(OrderedDict([('name', name), ('operation', operation), ('shape', shape),
+                ('size', size), ('seconds', seconds), ('memory_growth_mb', growth), ('peak_memory_mb', peak)]))
+    finally:
+        shutil.rmtree(work_dir)
+
+    try:
+        with open(os.devnull, 'w') as devnull:
+            revision = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=here, stderr=devnull).strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    with open(results_file, 'w') as f:
+        json.dump(OrderedDict([
+            ('created', time.strftime('%Y-%m-%dT%H:%M:%S')), ('revision', revision),
+            ('python', platform.python_version()), ('platform', platform.platform()),
+            ('repeat', repeat), ('results', results)]), f, indent=2)
+    print 'Results written to %s' % results_file
+
+
+def compare_results(old_file, new_file, time_tolerance=0.2, memory_tolerance=0.2):
+    # A case regressed if its time or process peak memory grew by more than `tolerance` (relative),
+    # ignoring differences under 5ms and 1MB that are noise. Returns whether there were no regressions.
+    with open(old_file) as f:
+        old = dict((result['name'], result) for result in json.load(f)['results'])
+    with open(new_file) as f:
+        new = json.load(f)['results']
+
+    regressions = 0
+    print '%-40s %10s %10s %7s %10s %10s %7s' % ('case', 'old s', 'new s', 'ratio', 'old MB', 'new MB', 'ratio')
+    for result in new:
+        if result['name'] not in old:
+            print '%-40s %10s %10.4f %7s %10s %10.1f %7s  (new)' % (result['name'], '-', result['seconds'], '-',
+                '-', result['peak_memory_mb'], '-')
+            continue
+        before = old[result['name']]
+        flags = []
+        if (result['seconds'] > before['seconds'] * (1 + time_tolerance) and
+                result['seconds'] - before['seconds'] > 0.005):
+            flags.append('SLOWER')
+        if (result['peak_memory_mb'] > before['peak_memory_mb'] * (1 + memory_tolerance) and
+                result['peak_memory_mb'] - before['peak_memory_mb'] > 1):
+            flags.append('BIGGER')
+        regressions += bool(flags)
+        print '%-40s %10.4f %10.4f %6.2fx %10.1f %10.1f %6.2fx  %s' % (result['name'], before['seconds'],
+            result['seconds'], result['seconds'] / max(before['seconds'], 1e-9), before['peak_memory_mb'],
+            result['peak_memory_mb'], result['peak_memory_mb'] / max(before['peak_memory_mb'], 1e-3),
+            ' '.join(flags))
+
+    print '%d regression(s) in %d cases' % (regressions, len(new))
+    return not regressions
+
+
+# modules CTDopts must not import until a feature needing them is used
+LAZY_MODULES = ['argparse', 'pytz', 'datetime', 'StringIO', 'atexit', 'xml.etree.ElementTree', 'xml.dom.minidom',
+    'tempfile', 'json', 'numpy']
+
+STARTUP_SCRIPT = """
+import sys, time
+start = time.time()
+from CTDopts import CTDopts, _TeeStream, _CaptureBuffer, _FdCapture
+imported = time.time()
+eager = [name for name in %r if name in sys.modules]
+
+opts = CTDopts(name='startupTool', version='0.0.1')
+root = opts.get_root()
+for i in xrange(20):
+    root.add('param_%%d' %% i, type=int, num_range=(0, 100), default=i)
+group = root.add_group('files', 'Input files')
+group.add('input_files', is_list=True, required=True, file_formats=['fastq'])
+opts.parse_args(['-param_3', '42', '-files:input_files', 'a.fastq', 'b.fastq'])
+print (imported - start) * 1000, (time.time() - imported) * 1000, ','.join(eager)
+"""
+
+
+def bench_startup(import_budget, parse_budget, runs=15):
+    # every run is a fresh interpreter so nothing is cached in sys.modules
+    here = os.path.dirname(os.path.abspath(__file__))
+    import_times, parse_times = [], []
+    for _ in xrange(runs):
+        output = subprocess.check_output([sys.executable, '-c', STARTUP_SCRIPT % LAZY_MODULES], cwd=here)
+        import_time, parse_time, eager = (output.split() + [''])[:3]
+        import_times.append(float(import_time))
+        parse_times.append(float(parse_time))
+
+    import_time = sorted(import_times)[runs / 2]
+    parse_time = sorted(parse_times)[runs / 2]
+    print 'import CTDopts:       %7.1fms (budget %7.1fms)' % (import_time, import_budget)
+    print 'define + parse_args:  %7.1fms (budget %7.1fms)' % (parse_time, parse_budget)
+    failures = []
+    if eager:
+        failures.append('modules imported eagerly: %s' % eager)
+    if import_time > import_budget:
+        failures.append('import time over budget')
+    if parse_time > parse_budget:
+        failures.append('parse_args time over budget')
+    for failure in failures:
+        print 'FAILED:', failure
+    return not failures
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] in (['suite'], ['compare']):
+        import argparse
+        parser = argparse.ArgumentParser(prog='benchmark.py %s' % sys.argv[1])
+        if sys.argv[1] == 'suite':
+            parser.add_argument('-o', '--output', default='benchmark_results.json')
+            parser.add_argument('--quick', action='store_true', help='only the smallest and a mid-sized case')
+            parser.add_argument('--filter', help='only cases whose operation/shape/size name matches')
+            parser.add_argument('--repeat', type=int, default=1)
+            args = parser.parse_args(sys.argv[2:])
+            run_suite(args.output, args.quick, args.filter, args.repeat)
+            sys.exit()
+        parser.add_argument('old')
+        parser.add_argument('new')
+        parser.add_argument('--time-tolerance', type=float, default=0.2)
+        parser.add_argument('--memory-tolerance', type=float, default=0.2)
+        args = parser.parse_args(sys.argv[2:])
+        sys.exit(0 if compare_results(args.old, args.new, args.time_tolerance, args.memory_tolerance) else 1)
+    if sys.argv[1:2] == ['startup']:
+        budgets = map(float, sys.argv[2:4]) + [25.0, 50.0][len(sys.argv[2:4]):]
+        sys.exit(0 if bench_startup(*budgets) else 1)
+    if sys.argv[1:2] == ['fdcapture']:
+        bench_fd_capture(int(sys.argv[2]) if len(sys.argv) > 2 else 200)
+        sys.exit()
+    if sys.argv[1:2] == ['emit']:
+        bench_emit(*(map(int, sys.argv[2:4]) + [10000, 50][len(sys.argv[2:4]):]))
+        sys.exit()
+    if sys.argv[1:2] == ['tee']:
+        bench_tee(int(sys.argv[2]) if len(sys.argv) > 2 else 1000000)
+        sys.exit()
+
+    sizes = map(int, sys.argv[1:]) or [1000, 10000, 100000]
+    print 'write_ctd()'
+    for size in sizes:
+        bench_write_ctd(size)
+    print 'read_ini()'
+    for size in sizes:
+        bench_read_ini(size)
+    print 'parse_args(--input_ctd)'
+    for size in sizes:
+        bench_parse_args(size)
+    print 'definition, %d levels deep' % 20
+    for size in sizes:
+        bench_definition(size)
+    print 'parse_args(), compiled parameters'
+    for size in sizes:
+        bench_fast_parse(size / 10)
@@ -98,9 +98,23 @@ minorparams.add(
 #        Imports arguments from CTD file. Further command line arguments, if present, can be used
 #        to override parameters in CTD.
 #
+#   CTD filenames ending in .gz, .bz2 or .xz (with all three directives) are compressed and
+#   decompressed on the fly. xz needs the backports.lzma package on Python 2.
+#
 #   --write_param_ctd <filename>
 #        Outputs a CTD with the actual parameter values the tool was called with. If the tool was
 #        called with an input CTD and some more command line arguments, it will do the overriding etc.
+#        With --write_param_sidecar a binary <filename>.sidecar is written too, with the values already
+#        cast and numeric lists packed. --input_ctd <filename> --read_param_sidecar loads that instead of
+#        parsing the XML as long as neither the CTD nor the tool definition changed since. Only pass
+#        --read_param_sidecar for sidecars you wrote yourself (or trust as much as the tool's input).
+#        The CTD holds a parameter_fingerprint ITEM (advanced, next to the version one): a canonical
+#        sha256 of the resolved parameter values, the same whatever order and way (command line, input
+#        CTD) they were given in. With
+#        --fingerprint_input_files the contents of the 'input file' parameters' files count too.
+#        From Python: tool_opts.parameter_fingerprint(). To skip runs whose parameters haven't changed,
+#        check tool_opts.find_previous_run(cache_dir) after parsing and call
+#        tool_opts.record_run(cache_dir) once a run succeeded.
 #
 #   --log_output
 #        If --write_param_ctd is set, this flag will enable the CTDopts object to have logging
@@ -115,10 +129,85 @@ minorparams.add(
 #        This flag makes CTDopts hijack the stdout and stderr streams and log both seamlessly. If set,
 #        the user doesn't have to deal with logging these streams, it will be done automatically, and
 #        the CTD with logging information will be saved even if the program crashes.
+#        With --log_capture_fds the file descriptors 1 and 2 are captured instead of Python's sys.stdout and
+#        sys.stderr, so output of child processes and C extensions gets logged too.
+#        Captured output is kept in memory up to --log_memory_limit bytes (default 8MB) and spilled to a
+#        temporary file beyond that. --log_max_bytes <n> caps how much is kept at all; --log_truncate
+#        head|tail|head_tail (default) decides whether the first, the last or both ends are kept.
+#
+#   --log_checkpoint_interval <seconds>
+#        Used with --log_output: rewrites the log CTD every <seconds> while the tool runs, with
+#        executionStatus="-1" and the last 64KB of captured output, so a killed run still leaves a log
+#        behind. The file is replaced atomically; finalize_log() overwrites it with the final log.
+#
+#   --log_resources
+#        Used with --log_output: records the time spent in named phases (see phase() below) and the
+#        resource usage of the run in the log CTD, as 'phases' and 'resources' NODEs of an 'execution'
+#        NODE after the parameters (the CTD schema allows nothing but text in <log>). Checkpoints have
+#        them too. From Python: set tool_opts.log_resources = True before finalize_log().
+#
+#   --log_input_checksums
+#        Used with --log_output: computes the sha256 of the input files (parameters with file_formats)
+#        in background threads while the tool runs and records them in the log CTD for provenance.
+#        They go into an 'input_files' NODE of the 'execution' NODE (see --log_resources). Digests are
+#        cached in ~/.cache/ctdopts/checksums (the most recent few thousand), so unchanged files aren't
+#        hashed again by later runs; CTDopts(..., checksum_cache_dir=None) turns that off.
+#        From Python: tool_opts.start_input_checksums().
+#
+#   --check_input_files
+#        After parsing, checks that the files given to parameters with file_formats exist, are readable
+#        and not empty, and exits with all problems in one report if they aren't. --sniff_input_files
+#        also checks that their first bytes fit their extension, for formats with a magic number
+#        (.gz, .bz2, .xz, .bam, .cram): a .gz file that isn't gzip data, say.
+#        Files are checked in a thread pool and stat'ed once. From Python: tool_opts.check_input_files().
+#
+#   --sweep <spec.json>
+#        Writes a param CTD per combination of a parameter sweep into --sweep_dir (default:
+#        testTool_sweep), the other parameters taken from the command line or --input_ctd, and exits.
+#        Swept parameters needn't be given there, even required ones.
+#        The spec combines any of
+#            {"grid": {"positive_number": [1, 2, 3], "this_or_that": ["this", "that"]},
+#             "zip": {"subparams:param_1": [0.5, 1.5], "subparams:param_2": [[1.0], [2.0, 3.0]]},
+#             "random": {"samples": 10, "seed": 1,
+#                        "parameters": {"subparams:subsubsetting:param_3": {"uniform": [0, 9]}}}}
+#        Every value is checked against the parameter's restrictions first. CTDs are written across
+#        --sweep_processes processes (default: one per CPU), and the directory gets a manifest.tsv
+#        listing every file with its parameter fingerprint and swept values (one tab separated line
+#        each; values of list parameters are JSON arrays, e.g. ["a b",2.0]).
+#        From Python: tool_opts.sweep(spec, out_dir), or tool_opts.sweep_combinations(spec).
+#
+#   --validate_ctds <directory, glob pattern or filename> [...]
+#        Checks parameter CTDs (e.g. one per planned job) against the tool definition in a process pool,
+#        prints every out-of-range value, wrong file extension, invalid choice or missing required
+#        parameter per file and exits. Exit status is 1 if any of them was invalid.
+#        --validate_processes <n> sets the number of worker processes (default: one per CPU).
+#        From Python: tool_opts.validate_ctds(paths) returns a ValidationReport per file.
+#        Files are checked against the bundled CTD schema too (see --validate_schema).
+#
+#   --validate_schema
+#        Checks the input CTD and every CTD written against the bundled CTD_0_3/Param_1_6_2 schemas
+#        and warns about what doesn't conform. From Python: tool_opts.validate_schema(filename), or
+#        without a filename for the CTD the tool would write; CTDopts.SchemaValidator can be reused
+#        for any number of files.
+#
+#   The same command lines can be parsed in-process, from any number of threads, without exiting,
+#   printing or touching sys.stdout/sys.stderr:
+#        parser = tool_opts.compile_parser()
+#        result = parser.parse(['--input_ctd', 'job.ctd', '-positive_number', '8'])
+#   result.namespace is what parse_args() returns, result.values has the values by full parameter name
+#   and result.warnings the out-of-range values and wrong file extensions parse_args() would warn about.
+#   Invalid command lines raise CTDopts.CTDParseError. CTDs asked for with --write_param_ctd and
+#   --write_tool_ctd are written by result.write_ctds(); logging and validation directives aren't supported.
 #
 #   normal command line parameters according to the definition above, with a single dash prefix.
 #        -positive_number 8 -boolean_flag -input_files a1.fastq a2.fastq ...
 #        Order of resolution: command line arguments > values in input CTD > default
+#        List parameters can be given a manifest file instead, one value per line (gzipped if it ends
+#        in .gz): -input_files @manifest.txt.gz. The values are checked once while parsing, the value is
+#        then a CTDopts.ManifestList, which streams the file on every iteration instead of holding it in
+#        memory. Param CTDs reference the manifest as @/absolute/path#sha256=<digest> instead of listing
+#        its values, and reading one whose manifest has changed since is an error (a relative @path in a
+#        hand-written CTD is relative to the CTD).
 
 args = tool_opts.parse_args()
 
@@ -137,10 +226,21 @@ arg_dict = vars(args)
 print 'Subparameter 1: ', arg_dict['subparams:param_1']
 print 'Input files:', ', '.join(arg_dict['input_files'])
 print 'Boolean flag:', args.boolean_flag
+
+# subparameters can also be reached through a nested namespace view, or looked up directly by path
+nested_args = tool_opts.get_nested_namespace(args)
+print 'Subsubsetting parameter 3: ', nested_args.subparams.subsubsetting.param_3
+print 'Subparameter 2: ', tool_opts.get_value('subparams:param_2')
 print
-print 'Doing stuff...'
-print '...so we have some output to log. (if you called the tool with logging flags)'
-print 'Finished.'
+
+# with --log_output --log_resources, the log CTD gets the time spent in named phases (CTDopts' own ones
+# like read_ini and parse_args, and any set with phase(), which also works as a function decorator)
+# and the resource usage of the run (CPU time, peak RSS, I/O...). The final write of the log CTD can't
+# be timed in itself, the write_ctd phase only counts earlier writes.
+with tool_opts.phase('doing_stuff'):
+    print 'Doing stuff...'
+    print '...so we have some output to log. (if you called the tool with logging flags)'
+    print 'Finished.'
 
 # # if you ran the script with --log_output --log_std_streams, include the following line
 # 1/0  # and try it with uncommenting this too! The log will be complete and contain the error too.
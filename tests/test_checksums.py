@@ -0,0 +1,68 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+import CTDopts
+from CTDopts import _ChecksumCache, _checksum_key, _file_checksum
+
+
+class ChecksumCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.tmp_dir, 'cache', 'checksums')
+        self.cache_size = CTDopts._CHECKSUM_CACHE_SIZE
+
+    def tearDown(self):
+        CTDopts._CHECKSUM_CACHE_SIZE = self.cache_size
+        shutil.rmtree(self.tmp_dir)
+
+    def write_file(self, name, data):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w') as f:
+            f.write(data)
+        return path
+
+    def test_digest_and_reuse(self):
+        path = self.write_file('input.txt', 'data\n')
+        self.assertEqual(_file_checksum(path, _ChecksumCache(self.cache_file)),
+            (5, hashlib.sha256('data\n').hexdigest()))
+        # a new cache reads the digest from the file instead of hashing again
+        cache = _ChecksumCache(self.cache_file)
+        cache.put(_checksum_key(os.stat(path)), 'cached')
+        self.assertEqual(_file_checksum(path, _ChecksumCache(self.cache_file)), (5, 'cached'))
+
+    def test_changed_file_is_hashed_again(self):
+        path = self.write_file('input.txt', 'data\n')
+        _file_checksum(path, _ChecksumCache(self.cache_file))
+        self.write_file('input.txt', 'other data\n')
+        self.assertEqual(_file_checksum(path, _ChecksumCache(self.cache_file))[1],
+            hashlib.sha256('other data\n').hexdigest())
+
+    def test_cache_file_is_bounded(self):
+        CTDopts._CHECKSUM_CACHE_SIZE = 8
+        cache = _ChecksumCache(self.cache_file)
+        for i in xrange(100):
+            cache.put('key %d' % i, '%064x' % i)
+            with open(self.cache_file) as f:
+                self.assertLess(len(f.readlines()), 2 * CTDopts._CHECKSUM_CACHE_SIZE)
+        reloaded = _ChecksumCache(self.cache_file)
+        self.assertEqual(reloaded.get('key 99'), '%064x' % 99)
+        self.assertEqual(reloaded.get('key 92'), '%064x' % 92)
+        self.assertIsNone(reloaded.get('key 0'))
+
+    def test_malformed_lines_are_skipped(self):
+        os.mkdir(os.path.dirname(self.cache_file))
+        with open(self.cache_file, 'w') as f:
+            f.write('garbage\nsha256 %s key\nsha256\n' % ('0' * 64))
+        self.assertEqual(_ChecksumCache(self.cache_file).get('key'), '0' * 64)
+
+    def test_unwritable_cache(self):
+        path = self.write_file('input.txt', 'data\n')
+        cache = _ChecksumCache(os.path.join(path, 'checksums'))  # below a file, can't be created
+        self.assertEqual(_file_checksum(path, cache)[1], hashlib.sha256('data\n').hexdigest())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from CTDopts import CTDopts
+
+
+def make_tool(checksum_cache_dir=None):
+    opts = CTDopts(name='fingerprintTool', version='1.0', checksum_cache_dir=checksum_cache_dir)
+    root = opts.get_root()
+    root.add('count', type=int, default=5)
+    root.add('ratio', type=float, default=0.5)
+    root.add('inputs', type=str, is_list=True, required=True, file_formats=['txt'], tags=['input file'])
+    return opts
+
+
+class FingerprintTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.input_file = self.path('input.txt')
+        self.write_input('data\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def path(self, name):
+        return os.path.join(self.tmp_dir, name)
+
+    def write_input(self, data):
+        with open(self.input_file, 'w') as f:
+            f.write(data)
+
+    def fingerprint(self, arg_strings, file_digests=False):
+        opts = make_tool(self.path('cache'))
+        opts.parse_args(['-inputs', self.input_file] + arg_strings)
+        return opts.parameter_fingerprint(file_digests)
+
+    def test_canonical(self):
+        self.assertEqual(self.fingerprint([]), self.fingerprint(['-count', '5', '-ratio', '0.50']))
+        self.assertNotEqual(self.fingerprint([]), self.fingerprint(['-count', '6']))
+
+    def test_file_digests(self):
+        plain, with_digests = self.fingerprint([]), self.fingerprint([], True)
+        self.write_input('other data\n')
+        self.assertEqual(self.fingerprint([]), plain)
+        self.assertNotEqual(self.fingerprint([], True), with_digests)
+
+    def test_record_run_creates_cache_dir(self):
+        run_dir = self.path(os.path.join('runs', 'nested'))
+        opts = make_tool()
+        opts.parse_args(['-inputs', self.input_file])
+        self.assertIsNone(opts.find_previous_run(run_dir))
+        record = opts.record_run(run_dir)
+        self.assertEqual(opts.record_run(run_dir), record)
+        self.assertEqual(opts.find_previous_run(run_dir), record)
+
+        other = make_tool()
+        other.parse_args(['-inputs', self.input_file, '-count', '6'])
+        self.assertIsNone(other.find_previous_run(run_dir))
+
+    def test_recorded_run_is_reusable(self):
+        opts = make_tool()
+        opts.parse_args(['-inputs', self.input_file, '-count', '7'])
+        record = opts.record_run(self.path('runs'))
+        again = make_tool()
+        again.parse_args(['--input_ctd', record])
+        self.assertEqual(again.find_previous_run(self.path('runs')), record)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import warnings
+from StringIO import StringIO
+
+from CTDopts import CTDopts
+
+
+def make_tool():
+    opts = CTDopts(name='bindTool', version='1.0')
+    root = opts.get_root()
+    root.add('count', type=int, num_range=(0, 100), default=5)
+    root.add('ratio', type=float, default=0.5)
+    root.add('mode', type=str, choices=['fast', 'slow'], default='fast')
+    root.add('verbose', type=bool, default=False)
+    group = root.add_group('lists', 'List parameters')
+    group.add('values', type=float, is_list=True, default=[1.0, 2.0])
+    group.add('names', type=str, is_list=True, required=True)
+    return opts
+
+
+class InputCtdBindingTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.ctd_file = os.path.join(self.tmp_dir, 'params.ctd')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_params(self, arg_strings):
+        result = make_tool().compile_parser().parse(arg_strings + ['--write_param_ctd', self.ctd_file])
+        result.write_ctds()
+        return result
+
+    def parse(self, arg_strings):
+        return vars(make_tool().parse_args(arg_strings))
+
+    def test_round_trip(self):
+        self.write_params(['-count', '7', '-ratio', '-1.5', '-mode', 'slow', '-verbose',
+            '-lists:values', '3', '4.5', '-lists:names', 'a b', 'c'])
+        values = self.parse(['--input_ctd', self.ctd_file])
+        self.assertEqual(values['count'], 7)
+        self.assertEqual(values['ratio'], -1.5)
+        self.assertEqual(values['mode'], 'slow')
+        self.assertIs(values['verbose'], True)
+        self.assertEqual(values['lists:values'], [3.0, 4.5])
+        self.assertEqual(values['lists:names'], ['a b', 'c'])
+
+    def test_same_namespace_as_command_line(self):
+        arg_strings = ['-count', '7', '-lists:values', '3', '-lists:names', 'x']
+        self.write_params(arg_strings)
+        self.assertEqual(self.parse(['--input_ctd', self.ctd_file]), self.parse(arg_strings))
+
+    def test_command_line_overrides_input_ctd(self):
+        self.write_params(['-count', '7', '-lists:names', 'x', 'y'])
+        values = self.parse(['--input_ctd', self.ctd_file, '-count', '9', '-lists:names', 'z'])
+        self.assertEqual(values['count'], 9)
+        self.assertEqual(values['lists:names'], ['z'])
+        self.assertEqual(values['mode'], 'fast')
+
+    def test_argparse_fallback_binds_input_ctd(self):
+        # an abbreviated option isn't handled by the compiled parameters, argparse has to bind the rest
+        self.write_params(['-count', '7', '-lists:names', 'x'])
+        values = self.parse(['--input_ctd', self.ctd_file, '-rat', '2'])
+        self.assertEqual(values['ratio'], 2.0)
+        self.assertEqual(values['count'], 7)
+        self.assertEqual(values['lists:names'], ['x'])
+
+    def test_tool_parser_matches_parse_args(self):
+        self.write_params(['-count', '7', '-lists:names', 'x'])
+        arg_strings = ['--input_ctd', self.ctd_file, '-ratio', '3']
+        namespace = make_tool().compile_parser().parse(arg_strings).namespace
+        self.assertEqual(vars(namespace), self.parse(arg_strings))
+
+    def test_non_ascii_strings(self):
+        name = u'\xe9t\xe9'.encode('utf-8')
+        self.write_params(['-mode', 'slow', '-lists:names', name, 'x'])
+        self.assertEqual(self.parse(['--input_ctd', self.ctd_file])['lists:names'], [name, 'x'])
+
+    def test_invalid_value_in_input_ctd(self):
+        self.write_params(['-lists:names', 'x'])
+        with open(self.ctd_file) as f:
+            ctd = f.read()
+        with open(self.ctd_file, 'w') as f:
+            f.write(ctd.replace('type="int" value="5"', 'type="int" value="five"'))
+        stderr = sys.stderr
+        sys.stderr = StringIO()  # argparse's usage message
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                self.assertRaises(SystemExit, self.parse, ['--input_ctd', self.ctd_file])
+            self.assertIn("invalid is_in_range value: 'five'", sys.stderr.getvalue())
+        finally:
+            sys.stderr = stderr
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from CTDopts import CTDopts
+
+
+def make_tool():
+    opts = CTDopts(name='inputTool', version='1.0')
+    root = opts.get_root()
+    root.add('reads', type=str, is_list=True, required=True, file_formats=['fastq', 'gz'])
+    root.add('reference', type=str, required=True, file_formats=['fasta'])
+    root.add('output', type=str, default='out.txt', file_formats=['txt'], tags=['output file'])
+    return opts
+
+
+class CheckInputFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.write('a.fastq', '@read\n')
+        self.write('ref.fasta', '>chr1\n')
+        compressed = gzip.open(self.path('b.gz'), 'wb')
+        compressed.write('@read\n')
+        compressed.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def path(self, name):
+        return os.path.join(self.tmp_dir, name)
+
+    def write(self, name, data):
+        with open(self.path(name), 'w') as f:
+            f.write(data)
+
+    def issues(self, reads, reference='ref.fasta', sniff=False, threads=None):
+        opts = make_tool()
+        opts.parse_args(['-reads'] + map(self.path, reads) + ['-reference', self.path(reference),
+            '-output', self.path('missing_output.txt')])
+        return [(name, kind) for name, kind, message in opts.check_input_files(threads, sniff)]
+
+    def test_valid_files(self):
+        self.assertEqual(self.issues(['a.fastq', 'b.gz'], sniff=True), [])
+
+    def test_problems_by_kind(self):
+        self.write('empty.fastq', '')
+        os.mkdir(self.path('dir.fastq'))
+        issues = self.issues(['a.fastq', 'missing.fastq', 'empty.fastq', 'dir.fastq', 'missing2.fastq'],
+            'missing.fasta')
+        self.assertEqual(issues, [('-reads', 'missing'), ('-reads', 'not_a_file'), ('-reads', 'empty'),
+            ('-reference', 'missing')])
+
+    def test_sniffing(self):
+        self.write('fake.gz', 'not gzip data')
+        self.assertEqual(self.issues(['fake.gz']), [])
+        self.assertEqual(self.issues(['fake.gz'], sniff=True), [('-reads', 'wrong_content')])
+
+    def test_repeated_paths_and_threads(self):
+        reads = ['a.fastq', 'missing.fastq'] * 50
+        self.assertEqual(self.issues(reads, threads=1), self.issues(reads, threads=8))
+        opts = make_tool()
+        opts.parse_args(['-reads'] + map(self.path, reads) + ['-reference', self.path('ref.fasta')])
+        message = opts.check_input_files()[0][2]
+        self.assertIn('50 of 100 input files do not exist', message)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import unittest
+from StringIO import StringIO
+from xml.etree.ElementTree import Element, fromstring
+
+from CTDopts import _CaptureBuffer, _write_pretty_xml
+
+
+def written_text(text):
+    element = Element('executionMessage')
+    element.text = text
+    stream = StringIO()
+    _write_pretty_xml(stream, element)
+    return fromstring(stream.getvalue()).text
+
+
+class CaptureBufferTest(unittest.TestCase):
+    def captured(self, max_bytes, truncate, memory_limit=8 * 1024 * 1024):
+        buf = _CaptureBuffer(max_bytes, truncate, memory_limit)
+        for i in xrange(100):
+            buf.write(u'line %d: \xe9€\U0001f600\n' % i)
+        return buf
+
+    def test_truncated_output_is_valid_utf8(self):
+        for max_bytes in xrange(40, 60):
+            for truncate in ('head', 'tail', 'head_tail'):
+                for memory_limit in (8 * 1024 * 1024, 16):
+                    buf = self.captured(max_bytes, truncate, memory_limit)
+                    ''.join(buf.iter_chunks(7)).decode('utf-8')
+                    buf.tail(max_bytes / 3).decode('utf-8')
+                    self.assertIn(u'\U0001f600', written_text(buf))
+
+    def test_control_characters_are_replaced(self):
+        buf = _CaptureBuffer()
+        buf.write('\x1b[31mred\x1b[0m\x08 and \t tabs\r\n')
+        text = written_text(buf)
+        self.assertTrue(text.startswith('?[31mred?[0m? and \t tabs\n'), repr(text))
+        self.assertTrue(text.endswith('[3 control characters replaced by ?]'), repr(text))
+
+    def test_plain_text_is_unchanged(self):
+        self.assertEqual(written_text(u'caf\xe9 & <friends>\n'), u'caf\xe9 & <friends>\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import gzip
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from CTDopts import CTDopts, CTDParseError, ManifestList
+
+
+def make_tool():
+    opts = CTDopts(name='manifestTool', version='1.0')
+    root = opts.get_root()
+    root.add('sizes', type=int, is_list=True, num_range=(0, None), default=[1])
+    root.add('input_files', type=str, is_list=True, file_formats=['txt'], required=True)
+    return opts
+
+
+class ManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.manifest = self.write_manifest('sizes.txt', '1\n2\n\n3\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def path(self, name):
+        return os.path.join(self.tmp_dir, name)
+
+    def write_manifest(self, name, text):
+        with open(self.path(name), 'wb') as f:
+            f.write(text)
+        return self.path(name)
+
+    def parse(self, arg_strings):
+        return make_tool().compile_parser().parse(arg_strings + ['-input_files', 'a.txt'])
+
+    def test_values_from_manifest(self):
+        sizes = self.parse(['-sizes', '@' + self.manifest]).values['sizes']
+        self.assertIsInstance(sizes, ManifestList)
+        self.assertEqual(list(sizes), [1, 2, 3])
+        self.assertEqual(list(sizes), [1, 2, 3])  # re-iterable
+        self.assertEqual(len(sizes), 3)
+
+    def test_gzipped_manifest(self):
+        manifest = gzip.open(self.path('sizes.txt.gz'), 'wb')
+        manifest.write('4\n5\n')
+        manifest.close()
+        self.assertEqual(list(self.parse(['-sizes', '@' + self.path('sizes.txt.gz')]).values['sizes']), [4, 5])
+
+    def test_param_ctd_references_manifest(self):
+        ctd_file = self.path('params.ctd')
+        self.parse(['-sizes', '@' + self.manifest, '--write_param_ctd', ctd_file]).write_ctds()
+        with open(ctd_file) as f:
+            ctd = f.read()
+        self.assertIn('<LISTITEM value="@%s#sha256=' % self.manifest, ctd)
+        self.assertEqual(list(self.parse(['--input_ctd', ctd_file]).values['sizes']), [1, 2, 3])
+        self.assertEqual(make_tool().validate_schema(ctd_file), [])
+
+    def test_relative_manifest_in_ctd(self):
+        ctd_file = self.path('params.ctd')
+        self.parse(['-sizes', '@' + self.manifest, '--write_param_ctd', ctd_file]).write_ctds()
+        with open(ctd_file) as f:
+            ctd = f.read()
+        with open(ctd_file, 'w') as f:
+            f.write(ctd.replace('@' + self.manifest, '@sizes.txt'))
+        self.assertEqual(list(self.parse(['--input_ctd', ctd_file]).values['sizes']), [1, 2, 3])
+
+    def test_changed_manifest(self):
+        ctd_file = self.path('params.ctd')
+        self.parse(['-sizes', '@' + self.manifest, '--write_param_ctd', ctd_file]).write_ctds()
+        self.write_manifest('sizes.txt', '1\n2\n3\n4\n')
+        self.assertRaises(CTDParseError, self.parse, ['--input_ctd', ctd_file])
+        issues = make_tool().validate_ctds([ctd_file])[0].issues
+        self.assertEqual([(name, kind) for name, kind, message in issues], [('-sizes', 'invalid_value')])
+
+    def test_invalid_value(self):
+        self.write_manifest('sizes.txt', '1\ntwo\n3\n')
+        with self.assertRaises(CTDParseError) as context:
+            self.parse(['-sizes', '@' + self.manifest])
+        self.assertIn('line 2', str(context.exception))
+
+    def test_invalid_value_in_validate_ctds(self):
+        ctd_file = self.path('params.ctd')
+        self.parse(['-sizes', '@' + self.manifest, '--write_param_ctd', ctd_file]).write_ctds()
+        with open(ctd_file) as f:
+            ctd = f.read()
+        with open(ctd_file, 'w') as f:
+            f.write(re.sub(r'@[^"]*', '@bad.txt', ctd))  # without a digest
+        self.write_manifest('bad.txt', '1\n-2\nthree\n')
+        issues = make_tool().validate_ctds([ctd_file])[0].issues
+        self.assertEqual(sorted(kind for name, kind, message in issues), ['invalid_value', 'out_of_range'])
+
+    def test_range_problems_reported_once(self):
+        self.write_manifest('sizes.txt', '1\n-2\n-3\n')
+        result = self.parse(['-sizes', '@' + self.manifest])
+        self.assertEqual(len(result.warnings), 1)
+        self.assertIn('2 of 3 values', result.warnings[0])
+        self.assertEqual(list(result.values['sizes']), [1, -2, -3])
+        self.assertEqual(len(result.warnings), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
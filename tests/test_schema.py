@@ -0,0 +1,99 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from StringIO import StringIO
+from distutils.spawn import find_executable
+
+from CTDopts import CTDopts, SchemaValidator
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema_fixtures')
+SCHEMA = os.path.join(REPO_DIR, 'schema', 'CTD_0_3.xsd')
+XMLLINT = find_executable('xmllint')
+
+
+def xmllint_valid(path):
+    with open(os.devnull, 'w') as devnull:
+        return subprocess.call([XMLLINT, '--noout', '--schema', SCHEMA, path], stdout=devnull, stderr=devnull) == 0
+
+
+# Every file in schema_fixtures/ is named after the verdict of xmllint against the bundled schemas
+class SchemaFixtureTest(unittest.TestCase):
+    def setUp(self):
+        self.fixtures = sorted(os.listdir(FIXTURE_DIR))
+
+    def test_verdicts(self):
+        validator = SchemaValidator()
+        for name in self.fixtures:
+            problems = validator.validate(os.path.join(FIXTURE_DIR, name))
+            self.assertEqual(not problems, name.startswith('valid_'), '%s: %s' % (name, problems))
+
+    def test_verdicts_in_memory(self):
+        from xml.etree.ElementTree import parse
+        validator = SchemaValidator()
+        for name in self.fixtures:
+            if name != 'invalid_not_well_formed.ctd':
+                problems = validator.validate_element(parse(os.path.join(FIXTURE_DIR, name)).getroot())
+                self.assertEqual(not problems, name.startswith('valid_'), '%s: %s' % (name, problems))
+
+    @unittest.skipIf(XMLLINT is None, 'xmllint is not installed')
+    def test_fixtures_agree_with_xmllint(self):
+        for name in self.fixtures:
+            self.assertEqual(xmllint_valid(os.path.join(FIXTURE_DIR, name)), name.startswith('valid_'), name)
+
+
+class WrittenCtdSchemaTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def path(self, name):
+        return os.path.join(self.tmp_dir, name)
+
+    def assertSchemaValid(self, ctd_file):
+        self.assertEqual(SchemaValidator().validate(ctd_file), [])
+        if XMLLINT is not None:
+            self.assertTrue(xmllint_valid(ctd_file), ctd_file)
+
+    def make_tool(self):
+        opts = CTDopts(name='schemaTool', version='1.0', description='Writes schema-valid CTDs',
+            checksum_cache_dir=None)
+        root = opts.get_root()
+        root.add('count', type=int, num_range=(0, None), default=5)
+        group = root.add_group('files', 'Input files')
+        group.add('inputs', type=str, is_list=True, required=True, file_formats=['txt'], tags=['input file'])
+        return opts
+
+    def test_tool_ctd(self):
+        result = self.make_tool().compile_parser().parse(['--write_tool_ctd', self.path('tool.ctd')])
+        result.write_ctds()
+        self.assertSchemaValid(self.path('tool.ctd'))
+
+    def test_log_ctd_with_run_record(self):
+        input_file = self.path('input.txt')
+        with open(input_file, 'w') as f:
+            f.write('data\n')
+        opts = self.make_tool()
+        opts.parse_args(['-files:inputs', input_file, self.path('missing.txt'), '--write_param_ctd',
+            self.path('log.ctd'), '--log_output', '--log_resources', '--log_input_checksums'])
+        with opts.phase('work'):
+            pass
+        stdout = sys.stdout
+        sys.stdout = StringIO()  # finalize_log()'s message
+        try:
+            opts.finalize_log('output \x1b[1mbold\x1b[0m', 'errors', 0)
+        finally:
+            sys.stdout = stdout
+        self.assertSchemaValid(self.path('log.ctd'))
+        self.assertEqual(vars(self.make_tool().parse_args(['--input_ctd', self.path('log.ctd')]))['files:inputs'],
+            [input_file, self.path('missing.txt')])
+
+
+if __name__ == '__main__':
+    unittest.main()
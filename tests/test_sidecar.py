@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from CTDopts import CTDopts, _load_param_sidecar, _param_sidecar_file
+
+
+def make_tool(extra_param=False):
+    opts = CTDopts(name='sidecarTool', version='1.0')
+    root = opts.get_root()
+    root.add('count', type=int, default=5)
+    root.add('flag', type=bool, default=False)
+    root.add('values', type=float, is_list=True, default=[0.1, 2.5])
+    root.add('sizes', type=int, is_list=True, default=[1, 2, 3])
+    root.add('names', type=str, is_list=True, default=['a b', u'\xe9'.encode('utf-8')])
+    if extra_param:
+        root.add('extra', type=int, default=1)
+    return opts
+
+
+class SidecarTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.ctd_file = os.path.join(self.tmp_dir, 'params.ctd')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_params(self, arg_strings):
+        opts = make_tool()
+        opts.parse_args(arg_strings)
+        opts.out_ctd_file = self.ctd_file
+        opts.write_ctd()
+        opts.write_param_sidecar()
+
+    def parse(self, arg_strings, opts=None):
+        return vars((opts or make_tool()).parse_args(arg_strings))
+
+    def test_sidecar_matches_xml(self):
+        self.write_params(['-count', '7', '-flag', '-values', '0.1', '1e-20', '-sizes', '-4', '-names', 'x'])
+        self.assertIsNotNone(_load_param_sidecar(self.ctd_file, make_tool().definition_hash()))
+        from_sidecar = self.parse(['--input_ctd', self.ctd_file, '--read_param_sidecar'])
+        self.assertEqual(from_sidecar, self.parse(['--input_ctd', self.ctd_file]))
+        self.assertEqual(from_sidecar['values'], [0.1, 1e-20])
+        self.assertEqual(from_sidecar['sizes'], [-4])
+
+    def test_defaults_round_trip(self):
+        self.write_params([])
+        self.assertEqual(self.parse(['--input_ctd', self.ctd_file, '--read_param_sidecar']), self.parse([]))
+
+    def test_changed_ctd_invalidates_sidecar(self):
+        self.write_params(['-count', '7'])
+        with open(self.ctd_file) as f:
+            ctd = f.read()
+        with open(self.ctd_file, 'w') as f:
+            f.write(ctd.replace('type="int" value="7"', 'type="int" value="8"'))
+        self.assertIsNone(_load_param_sidecar(self.ctd_file, make_tool().definition_hash()))
+        self.assertEqual(self.parse(['--input_ctd', self.ctd_file, '--read_param_sidecar'])['count'], 8)
+
+    def test_changed_definition_invalidates_sidecar(self):
+        self.write_params(['-count', '7'])
+        opts = make_tool(extra_param=True)
+        self.assertIsNone(_load_param_sidecar(self.ctd_file, opts.definition_hash()))
+        values = self.parse(['--input_ctd', self.ctd_file, '--read_param_sidecar'], opts)
+        self.assertEqual((values['count'], values['extra']), (7, 1))
+
+    def test_truncated_sidecar_is_ignored(self):
+        self.write_params(['-sizes', '1', '2', '3', '4'])
+        sidecar_file = _param_sidecar_file(self.ctd_file)
+        with open(sidecar_file, 'rb') as f:
+            data = f.read()
+        with open(sidecar_file, 'wb') as f:
+            f.write(data[:-4])
+        self.assertIsNone(_load_param_sidecar(self.ctd_file, make_tool().definition_hash()))
+        self.assertEqual(self.parse(['--input_ctd', self.ctd_file, '--read_param_sidecar'])['sizes'], [1, 2, 3, 4])
+
+    def test_sidecar_only_read_when_asked(self):
+        self.write_params(['-count', '7'])
+        with open(_param_sidecar_file(self.ctd_file), 'wb') as f:
+            f.write('garbage')
+        self.assertEqual(self.parse(['--input_ctd', self.ctd_file])['count'], 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
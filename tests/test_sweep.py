@@ -0,0 +1,86 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from CTDopts import CTDopts
+
+
+SPEC = {
+    'grid': {'mode': ['fast', 'slow'], 'count': [1, 2, 3]},
+    'zip': {'names': [['a b', 'c'], ['d']], 'ratio': [0.5, 1.5]},
+    'random': {'samples': 3, 'seed': 42, 'parameters': {'seed': {'uniform': [0, 1000]}}},
+}
+
+
+def make_tool():
+    opts = CTDopts(name='sweepTool', version='1.0')
+    root = opts.get_root()
+    root.add('count', type=int, num_range=(0, 10), default=5)
+    root.add('ratio', type=float, default=1.0)
+    root.add('mode', type=str, choices=['fast', 'slow'], default='fast')
+    root.add('seed', type=int, default=0)
+    root.add('names', type=str, is_list=True, default=['x'])
+    root.add('fixed', type=int, default=7)
+    return opts
+
+
+def read_files(directory):
+    contents = {}
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name), 'rb') as f:
+            contents[name] = f.read()
+    return contents
+
+
+class SweepTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def sweep(self, name, processes):
+        out_dir = os.path.join(self.tmp_dir, name)
+        make_tool().sweep(SPEC, out_dir, processes)
+        return read_files(out_dir)
+
+    def test_combinations(self):
+        combinations = list(make_tool().sweep_combinations(SPEC))
+        self.assertEqual(len(combinations), 2 * 3 * 2 * 3)
+        self.assertEqual(combinations, list(make_tool().sweep_combinations(SPEC)))
+        self.assertEqual(combinations[0].keys(), ['count', 'mode', 'names', 'ratio', 'seed'])
+        self.assertEqual(len(set(combination['seed'] for combination in combinations[:3])), 3)
+
+    def test_deterministic_across_runs_and_processes(self):
+        single = self.sweep('single', 1)
+        self.assertEqual(len(single), 36 + 1)
+        self.assertEqual(self.sweep('again', 1), single)
+        if hasattr(os, 'fork'):
+            self.assertEqual(self.sweep('pool', 3), single)
+
+    def test_manifest_matches_ctds(self):
+        out_dir = os.path.join(self.tmp_dir, 'sweep')
+        manifest_file = make_tool().sweep(SPEC, out_dir, 1)
+        with open(manifest_file) as f:
+            rows = [line.rstrip('\n').split('\t') for line in f]
+        self.assertEqual(rows[0], ['file', 'fingerprint', 'count', 'mode', 'names', 'ratio', 'seed'])
+        for filename, fingerprint, count, mode, names, ratio, seed in rows[1:]:
+            opts = make_tool()
+            values = vars(opts.parse_args(['--input_ctd', os.path.join(out_dir, filename)]))
+            self.assertEqual(opts.parameter_fingerprint(), fingerprint)
+            self.assertEqual((values['count'], values['mode'], values['names'], values['ratio'], values['seed']),
+                (int(count), mode, json.loads(names), float(ratio), int(seed)))
+            self.assertEqual(values['fixed'], 7)
+
+    def test_invalid_values_fail_early(self):
+        out_dir = os.path.join(self.tmp_dir, 'invalid')
+        self.assertRaises(ValueError, make_tool().sweep, {'grid': {'count': [1, 'many']}}, out_dir, 1)
+        self.assertRaises(ValueError, make_tool().sweep, {'grid': {'mode': ['medium']}}, out_dir, 1)
+        self.assertRaises(ValueError, make_tool().sweep, {'zip': {'count': [1], 'seed': [1, 2]}}, out_dir, 1)
+        self.assertFalse(os.path.exists(os.path.join(out_dir, 'manifest.tsv')))
+
+
+if __name__ == '__main__':
+    unittest.main()